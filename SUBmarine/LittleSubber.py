@@ -1,36 +1,2900 @@
 import sys
 import json
-from datetime import datetime
+import csv
+import argparse
+from datetime import datetime, date, timedelta
+import calendar
+import bisect
+import heapq
 import os
 import webbrowser
 import colorsys
-import requests
-from bs4 import BeautifulSoup
 import io
-from urllib.parse import urlparse
-
-# Optional favicon import for dynamic tracking
-HAS_FAVICON = True
-try:
-    import favicon
-except ImportError:
-    HAS_FAVICON = False
-
-# Ensure the system tkinter (TK) library is available. customtkinter depends on
-# the stdlib tkinter which is often provided by a separate system package
-# (for example `python3-tk` on Debian/Ubuntu). If it's missing, we fall back to
-# a basic CLI so the script doesn't crash and basic subscription management
-# still works.
-HAS_TK = True
-try:
-    import tkinter  # noqa: F401 - runtime check only
-except Exception:
-    HAS_TK = False
-    print("Warning: the 'tkinter' module is not available in this Python environment.")
-    print("customtkinter (the GUI) won't be available. Falling back to CLI mode.")
-    print("To enable the GUI, install your system's Tk package (e.g. python3-tk).")
-
-if HAS_TK:
+import codecs
+import uuid
+import math
+import time
+import queue
+import random
+import threading
+import hashlib
+import weakref
+import contextlib
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+from urllib.parse import urlparse, urljoin, parse_qs, quote
+from html.parser import HTMLParser
+from decimal import Decimal, ROUND_HALF_UP
+
+# Heavy dependencies are imported where they are first used: requests for
+# fetching, PIL for icons, sqlite3 for the SQLite backend and the GUI toolkit
+# in load_gui(). The CLI and totals queries start without any of them.
+# HAS_TK is a cheap guess until load_gui() has actually tried the import.
+HAS_TK = None
+ctk = Image = messagebox = tkinter = None
+GUI_NAMES = ("SubscriptionCard", "SubscriptionList", "ThemeManager", "SubscriptionTracker")
+
+
+def new_subscription_id():
+    return uuid.uuid4().hex
+
+
+def assign_subscription_ids(subscriptions):
+    """Give every subscription a stable id. Returns True if any were added."""
+    changed = False
+    for sub in subscriptions:
+        if not sub.get("id"):
+            sub["id"] = new_subscription_id()
+            changed = True
+    return changed
+
+
+class Subscription(MutableMapping):
+    """One subscription in memory.
+
+    Slotted, so a big ledger doesn't carry a dict of the same keys for every
+    row, but it reads and writes like the dicts it replaced: sub["name"],
+    sub.get("website"), sub.update(changes). Keys that aren't a known field
+    go into a small extra dict, and a field set to None counts as missing.
+    Icons are never held here, only the icon_id of the stored PNG.
+    """
+
+    FIELDS = ("id", "name", "price", "cycle", "date_added", "website", "currency", "title", "icon_id")
+    # Repeated on every row, one shared string each is enough
+    INTERNED = ("cycle", "currency", "date_added")
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(self, data=(), **kwargs):
+        for field in self.FIELDS:
+            setattr(self, field, None)
+        self.extra = None
+        self.update(data, **kwargs)
+
+    def update(self, data=(), **kwargs):
+        # Same as MutableMapping.update, minus its checks on the hot path
+        items = data.items() if isinstance(data, Mapping) else data
+        for key, value in items:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key in _SUBSCRIPTION_FIELDS:
+            value = getattr(self, key)
+            if value is None:
+                raise KeyError(key)
+            return value
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+
+    def get(self, key, default=None):
+        if key in _SUBSCRIPTION_FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        if self.extra is None:
+            return default
+        return self.extra.get(key, default)
+
+    def __setitem__(self, key, value):
+        if key in _SUBSCRIPTION_FIELDS:
+            if key in self.INTERNED and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, key, value)
+        elif value is None:
+            self.pop(key, None)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _SUBSCRIPTION_FIELDS:
+            if getattr(self, key) is None:
+                raise KeyError(key)
+            setattr(self, key, None)
+            return
+        if self.extra is None:
+            raise KeyError(key)
+        del self.extra[key]
+        if not self.extra:
+            self.extra = None
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __iter__(self):
+        for field in self.FIELDS:
+            if getattr(self, field) is not None:
+                yield field
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def clear(self):
+        for field in self.FIELDS:
+            setattr(self, field, None)
+        self.extra = None
+
+    def to_dict(self):
+        data = {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __repr__(self):
+        return f"Subscription({self.to_dict()!r})"
+
+
+_SUBSCRIPTION_FIELDS = frozenset(Subscription.FIELDS)
+
+
+def json_default(value):
+    # Lets json.dumps write Subscription objects like the dicts they replaced
+    if isinstance(value, Subscription):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+SCHEMA_VERSION = 2
+
+
+def ledger_rows(data):
+    """(rows, schema version) from a parsed ledger file.
+
+    Version 1 was a bare list of dicts, possibly without ids and with hex
+    encoded icons. Version 2 wraps the list as {"version": 2, "subscriptions": [...]}.
+    """
+    if isinstance(data, list):
+        return data, 1
+    version = data.get("version", 1)
+    if version > SCHEMA_VERSION:
+        raise ValueError(f"ledger was written by a newer SUBmarine (schema {version})")
+    return data.get("subscriptions", []), version
+
+
+def ledger_document(subscriptions):
+    return json.dumps({"version": SCHEMA_VERSION, "subscriptions": list(subscriptions)},
+                      default=json_default)
+
+
+def hue_to_color(hue, s=0.8, v=0.9):
+    rgb = tuple(int(x * 255) for x in colorsys.hsv_to_rgb(hue/360, s, v))
+    return "#{:02x}{:02x}{:02x}".format(*rgb)
+
+
+class Diagnostics:
+    """Timing spans, counters and latency histograms for the hot paths.
+
+    Off by default. While off, span() hands back one shared do-nothing
+    context and count() returns straight away, so the instrumentation left
+    in place costs a method call.
+    """
+
+    # Upper bounds in ms, the last bucket takes everything slower
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._null = contextlib.nullcontext()
+        self.reset()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.spans = {}  # name -> [calls, total ms, max ms]
+            self.histograms = {}  # name -> count per bucket
+
+    def span(self, name):
+        if not self.enabled:
+            return self._null
+        return self._timed(name)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - started) * 1000)
+
+    def observe(self, name, ms):
+        bucket = bisect.bisect_left(self.BUCKETS_MS, ms)
+        with self._lock:
+            stats = self.spans.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += ms
+            stats[2] = max(stats[2], ms)
+            self.histograms.setdefault(name, [0] * (len(self.BUCKETS_MS) + 1))[bucket] += 1
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        """Everything recorded so far as plain JSON-friendly data."""
+        with self._lock:
+            labels = [f"<={b}ms" for b in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}ms"]
+            return {
+                "enabled": self.enabled,
+                "counters": dict(sorted(self.counters.items())),
+                "spans": {name: {"calls": calls, "total_ms": round(total, 3),
+                                 "mean_ms": round(total / calls, 3), "max_ms": round(peak, 3),
+                                 "histogram": {label: n for label, n in
+                                               zip(labels, self.histograms[name]) if n}}
+                          for name, (calls, total, peak) in sorted(self.spans.items())},
+            }
+
+    def report(self):
+        """snapshot() as a few lines of text."""
+        snap = self.snapshot()
+        lines = [f"{'span':<22}{'calls':>7}{'mean ms':>10}{'max ms':>10}"]
+        for name, stats in snap["spans"].items():
+            lines.append(f"{name:<22}{stats['calls']:>7}{stats['mean_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+        lines.append("")
+        lines.extend(f"{name:<29}{value:>10}" for name, value in snap["counters"].items())
+        return "\n".join(lines)
+
+
+diag = Diagnostics()
+if os.environ.get("SUBMARINE_DIAGNOSTICS") == "1":
+    diag.enable()
+
+
+def default_subscriptions_path():
+    return os.path.join(os.path.dirname(__file__), "subscriptions.json")
+
+
+def fsync_directory(path):
+    # Make a rename durable, not supported on Windows
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, data):
+    """Write data (str or bytes) to path via a fsynced temp file and rename,
+    so readers see either the old or the new file and never a partial one."""
+    # Unique per writer, fetcher threads may store the same icon at once
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with diag.span("io.atomic_write"):
+        with open(tmp_path, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            diag.count("io.bytes_written", f.tell())
+        os.replace(tmp_path, path)
+        fsync_directory(path)
+
+
+CENT = Decimal("0.01")
+DEFAULT_CURRENCY = "USD"
+
+
+def to_cents(price):
+    """Exact integer cents for a price, going through str() to avoid float noise."""
+    return int((Decimal(str(price)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def totals_from_cents(monthly_cents, yearly_cents):
+    """(monthly, yearly) Decimal totals from the summed prices of each cycle."""
+    monthly = (Decimal(monthly_cents) + Decimal(yearly_cents) / 12) / 100
+    yearly = Decimal(monthly_cents * 12 + yearly_cents) / 100
+    return monthly.quantize(CENT, rounding=ROUND_HALF_UP), yearly.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class TotalsAggregator:
+    """Running totals kept as integer cents per (currency, cycle).
+
+    Adding, updating or removing a subscription adjusts one bucket, so the
+    totals never need a pass over the ledger and can't drift the way summed
+    floats do.
+    """
+
+    def __init__(self, subscriptions=()):
+        self._sums = {}
+        self._contributions = {}
+        for sub in subscriptions:
+            self.add(sub)
+
+    @staticmethod
+    def _key(sub):
+        cycle = "Monthly" if sub.get("cycle") == "Monthly" else "Yearly"
+        return sub.get("currency") or DEFAULT_CURRENCY, cycle
+
+    def add(self, sub):
+        """Count sub, replacing whatever was counted for its id before."""
+        self.remove(sub["id"])
+        key = self._key(sub)
+        cents = to_cents(sub.get("price", 0))
+        self._contributions[sub["id"]] = (key, cents)
+        self._sums[key] = self._sums.get(key, 0) + cents
+
+    def remove(self, sub_id):
+        previous = self._contributions.pop(sub_id, None)
+        if previous is not None:
+            key, cents = previous
+            self._sums[key] -= cents
+            if not self._sums[key]:
+                del self._sums[key]
+
+    def clear(self):
+        self._sums.clear()
+        self._contributions.clear()
+
+    def breakdown(self):
+        """{(currency, cycle): summed price} without touching the ledger."""
+        return {key: Decimal(cents) / 100 for key, cents in self._sums.items()}
+
+    def by_currency(self):
+        """{currency: (monthly, yearly)}"""
+        currencies = {currency for currency, _ in self._sums}
+        return {currency: totals_from_cents(self._sums.get((currency, "Monthly"), 0),
+                                            self._sums.get((currency, "Yearly"), 0))
+                for currency in currencies}
+
+    def totals(self):
+        """(monthly, yearly) over every subscription."""
+        monthly_cents = sum(c for (_, cycle), c in self._sums.items() if cycle == "Monthly")
+        yearly_cents = sum(c for (_, cycle), c in self._sums.items() if cycle == "Yearly")
+        return totals_from_cents(monthly_cents, yearly_cents)
+
+
+CURRENCY_SYMBOLS = {"USD": "$", "EUR": "\u20ac", "GBP": "\u00a3", "JPY": "\u00a5", "INR": "\u20b9"}
+# Used until a rates.json exists, value of one unit in USD
+DEFAULT_RATES = {"EUR": "1.08", "GBP": "1.27"}
+
+
+def format_money(amount, currency=None):
+    currency = currency or DEFAULT_CURRENCY
+    symbol = CURRENCY_SYMBOLS.get(currency)
+    return f"{symbol}{amount:.2f}" if symbol else f"{amount:.2f} {currency}"
+
+
+class ExchangeRates:
+    """Exchange rates read from a local rates.json:
+
+        {"base": "USD", "updated": "2026-10-01", "rates": {"EUR": "1.08", "GBP": "1.27"}}
+
+    Each rate is the value of one unit in the base currency. The file is
+    parsed once and cached. refresh() re-reads it only when it changed on
+    disk, so updated rates need an edit (or "rates --set"), never the network.
+    version goes up whenever the rates do.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.base = DEFAULT_CURRENCY
+        self.updated = None
+        self.rates = {}
+        self.version = 0
+        self._sig = False
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the file if it changed. Returns True if the rates did."""
+        sig = file_signature(self.path)
+        if sig == self._sig:
+            return False
+        self._sig = sig
+        data = {"base": DEFAULT_CURRENCY, "rates": DEFAULT_RATES}
+        try:
+            if sig is not None:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            base = data.get("base", DEFAULT_CURRENCY)
+            rates = {currency: Decimal(str(rate)) for currency, rate in data.get("rates", {}).items()}
+            if not all(rate.is_finite() and rate > 0 for rate in rates.values()):
+                raise ValueError("rates must be positive numbers")
+        except (OSError, ValueError, TypeError, AttributeError, ArithmeticError) as e:
+            # A bad edit keeps the previous rates, the next change is read again
+            print(f"Error reading exchange rates: {e}")
+            return False
+        self.base = base
+        self.updated = data.get("updated")
+        self.rates = rates
+        self.rates[self.base] = Decimal(1)
+        self.version += 1
+        return True
+
+    def currencies(self):
+        return sorted(self.rates)
+
+    def convert(self, amount, source, target):
+        """amount in source currency expressed in target, or None without a rate."""
+        if source == target:
+            return amount
+        if source not in self.rates or target not in self.rates:
+            return None
+        return amount * self.rates[source] / self.rates[target]
+
+    def set_rate(self, currency, rate):
+        self.rates[currency] = Decimal(str(rate))
+        self.updated = date.today().isoformat()
+        atomic_write(self.path, json.dumps({
+            "base": self.base,
+            "updated": self.updated,
+            "rates": {c: str(r) for c, r in sorted(self.rates.items()) if c != self.base},
+        }, indent=2))
+        self._sig = file_signature(self.path)
+        self.version += 1
+
+
+def rates_for(subs_path):
+    return ExchangeRates(os.path.join(os.path.dirname(subs_path), "rates.json"))
+
+
+class CurrencyTotals:
+    """A store's totals converted into one currency.
+
+    Sums come from store.breakdown(), one bucket per (currency, cycle), so
+    each currency is totalled once and converted once. The result is kept
+    until the store revision, the rates or the currency asked for change.
+    """
+
+    def __init__(self, store, rates):
+        self.store = store
+        self.rates = rates
+        self._key = None
+        self._result = None
+
+    def totals(self, currency=None):
+        """(monthly, yearly, {currency: (monthly, yearly)} that had no rate)"""
+        currency = currency or DEFAULT_CURRENCY
+        key = (id(self.store), self.store.revision, self.rates.version, currency)
+        if key == self._key:
+            return self._result
+        sums = {}
+        for (source, cycle), amount in self.store.breakdown().items():
+            cents = sums.setdefault(source, [0, 0])
+            cents[cycle != "Monthly"] += to_cents(amount)
+        monthly = yearly = Decimal(0)
+        unconverted = {}
+        for source, (monthly_cents, yearly_cents) in sums.items():
+            source_totals = totals_from_cents(monthly_cents, yearly_cents)
+            converted = [self.rates.convert(amount, source, currency) for amount in source_totals]
+            if converted[0] is None:
+                unconverted[source] = source_totals
+                continue
+            monthly += converted[0]
+            yearly += converted[1]
+        self._result = (monthly.quantize(CENT, rounding=ROUND_HALF_UP),
+                        yearly.quantize(CENT, rounding=ROUND_HALF_UP), unconverted)
+        self._key = key
+        return self._result
+
+
+def parse_date(value):
+    try:
+        # fromisoformat is far quicker, strptime also takes "2024-1-5"
+        if len(value) == 10 and value[4] == value[7] == "-":
+            return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def add_months(day, months):
+    """Same day of month, months later, clamped to the end of shorter months."""
+    years, month = divmod(day.month - 1 + months, 12)
+    year = day.year + years
+    return day.replace(year=year, month=month + 1,
+                       day=min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def next_renewal(sub, today=None):
+    """First billing date on or after today, counted from date_added.
+
+    date_added itself is the first payment, so a subscription added today
+    renews one cycle from now.
+    """
+    today = today or date.today()
+    start = parse_date(sub.get("date_added")) or today
+    step = 1 if sub.get("cycle") == "Monthly" else 12
+    elapsed = (today.year - start.year) * 12 + today.month - start.month
+    cycles = max(1, elapsed // step)
+    # Always count from the start so clamped month ends don't drift
+    renewal = add_months(start, cycles * step)
+    while renewal < today:
+        cycles += 1
+        renewal = add_months(start, cycles * step)
+    return renewal
+
+
+class RenewalIndex:
+    """Subscriptions sorted by their next renewal date.
+
+    Kept as a sorted list of (date ordinal, id) so due_within() is two
+    bisects plus the k results. Entries whose date has passed are rolled
+    forward lazily the next time the index is asked about a later day.
+    """
+
+    def __init__(self, subscriptions=(), today=None):
+        self.today = today or date.today()
+        self._entries = []
+        self._keys = {}
+        self._subs = {}
+        self._lock = threading.RLock()
+        # Bulk build: compute every date, sort once
+        for sub in subscriptions:
+            key = (next_renewal(sub, self.today).toordinal(), sub["id"])
+            self._entries.append(key)
+            self._keys[sub["id"]] = key
+            self._subs[sub["id"]] = sub
+        self._entries.sort()
+
+    def add(self, sub):
+        with self._lock:
+            self.remove(sub["id"])
+            key = (next_renewal(sub, self.today).toordinal(), sub["id"])
+            bisect.insort(self._entries, key)
+            self._keys[sub["id"]] = key
+            self._subs[sub["id"]] = sub
+
+    def remove(self, sub_id):
+        with self._lock:
+            key = self._keys.pop(sub_id, None)
+            if key is None:
+                return
+            self._subs.pop(sub_id, None)
+            i = bisect.bisect_left(self._entries, key)
+            if i < len(self._entries) and self._entries[i] == key:
+                del self._entries[i]
+
+    def advance(self, today=None):
+        """Roll renewals that are now in the past to their next date."""
+        today = today or date.today()
+        with self._lock:
+            if today <= self.today:
+                return
+            self.today = today
+            stale = []
+            while self._entries and self._entries[0][0] < today.toordinal():
+                stale.append(self._entries.pop(0)[1])
+            for sub_id in stale:
+                del self._keys[sub_id]
+                self.add(self._subs[sub_id])
+
+    def due_within(self, days, today=None):
+        """[(renewal date, subscription)] renewing in the next days days."""
+        today = today or date.today()
+        self.advance(today)
+        with self._lock:
+            lo = bisect.bisect_left(self._entries, (today.toordinal(), ""))
+            hi = bisect.bisect_right(self._entries, (today.toordinal() + days, "\uffff"))
+            return [(date.fromordinal(ordinal), self._subs[sub_id])
+                    for ordinal, sub_id in self._entries[lo:hi]]
+
+    def first_after(self, day):
+        """Earliest (renewal date, subscription) after day, or None."""
+        with self._lock:
+            i = bisect.bisect_right(self._entries, (day.toordinal(), "\uffff"))
+            if i == len(self._entries):
+                return None
+            ordinal, sub_id = self._entries[i]
+            return date.fromordinal(ordinal), self._subs[sub_id]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def month_index(day):
+    """Months since year 0, so month arithmetic is plain integer arithmetic."""
+    return day.year * 12 + day.month - 1
+
+
+def month_label(index):
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def parse_month(value):
+    """Month index for "YYYY-MM" (or a full date), None if it isn't one."""
+    day = parse_date(value) or parse_date(f"{value}-01")
+    return month_index(day) if day else None
+
+
+class ProjectionEngine:
+    """Month-by-month spend for a range of months, past or future.
+
+    Every subscription bills in the month of its date_added and then every
+    month (Monthly) or every 12 months (Yearly). Rather than walking each
+    subscription's billing events, each one is reduced to three numbers:
+    the offset of its first bill inside the range, its cycle and its price
+    in cents. Bills are then summed per (currency, cycle, first offset), a
+    running sum turns those into per-month spend (stepping 12 at a time for
+    yearly ones), and each currency series is converted once at the end.
+    With NumPy installed the grouping and sums run as array operations,
+    without it the same steps run over the much smaller groups in Python.
+
+    Results are cached per (range, currency) until the ledger or the rates
+    change.
+    """
+
+    def __init__(self, store, rates, cache_size=16):
+        self.store = store
+        self.rates = rates
+        self._cache = OrderedDict()
+        self.cache_size = cache_size
+        self._month_of = {}
+
+    def first_month(self, date_added):
+        # Dates repeat a lot across a ledger, parse each one once
+        month = self._month_of.get(date_added)
+        if month is None:
+            try:
+                month = int(date_added[:4]) * 12 + int(date_added[5:7]) - 1
+            except (TypeError, ValueError):
+                day = parse_date(date_added)
+                month = month_index(day) if day else False
+            self._month_of[date_added] = month
+        return month
+
+    def _columns(self, start, months):
+        """Column lists over the subscriptions billed inside the range:
+        ids, names, currency codes, yearly flags, price cents and the
+        offset of the first bill. Also returns the currency names."""
+        ids, names, codes, yearly_flags, prices, offsets = [], [], [], [], [], []
+        currencies = {}
+        cents_of = {}
+        for sub in self.store.iter_subscriptions():
+            first = self.first_month(sub.get("date_added"))
+            if first is False or first >= start + months:
+                continue
+            yearly = sub.get("cycle") == "Yearly"
+            offset = first - start
+            if offset < 0:
+                # Started before the range: first bill inside it
+                offset = offset % 12 if yearly else 0
+                if offset >= months:
+                    continue
+            price = sub.get("price", 0)
+            cents = cents_of.get(price)
+            if cents is None:
+                cents = cents_of[price] = to_cents(price)
+            currency = sub.get("currency") or DEFAULT_CURRENCY
+            code = currencies.get(currency)
+            if code is None:
+                code = currencies[currency] = len(currencies)
+            ids.append(sub["id"])
+            names.append(sub["name"])
+            codes.append(code)
+            yearly_flags.append(yearly)
+            prices.append(cents)
+            offsets.append(offset)
+        return (ids, names, codes, yearly_flags, prices, offsets), list(currencies)
+
+    def project(self, start, end, currency=None, top=25):
+        """Spend from month index start to end (inclusive) in currency.
+
+        Returns {"months", "spend", "cumulative", "services", "other",
+        "currency", "unconverted"}: month labels, Decimal spend and running
+        total per month, the top most expensive [(id, name, total)] over
+        the range, what everything else adds up to, and the currencies
+        left out for lack of a rate.
+        """
+        currency = currency or DEFAULT_CURRENCY
+        key = (start, end, currency, top)
+        version = (id(self.store), self.store.revision, self.rates.version)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == version:
+            self._cache.move_to_end(key)
+            return cached[1]
+
+        months = max(end - start + 1, 0)
+        with diag.span("projection.build"):
+            columns, currencies = self._columns(start, months)
+            try:
+                import numpy
+            except ImportError:
+                numpy = None
+            if numpy is not None and columns[0]:
+                series, service_cents = self._sum_numpy(numpy, columns, len(currencies), months)
+            else:
+                series, service_cents = self._sum_python(columns, len(currencies), months)
+            result = self._convert(start, months, currency, top, columns, currencies,
+                                   series, service_cents)
+
+        self._cache[key] = (version, result)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def _sum_python(self, columns, currency_count, months):
+        _, _, codes, yearly_flags, prices, offsets = columns
+        # Group first: a big ledger has far fewer (currency, cycle, offset) groups than rows
+        groups = {}
+        service_cents = []
+        for code, yearly, cents, offset in zip(codes, yearly_flags, prices, offsets):
+            key = (code, yearly, offset)
+            groups[key] = groups.get(key, 0) + cents
+            bills = (months - 1 - offset) // 12 + 1 if yearly else months - offset
+            service_cents.append(cents * bills)
+        first_bills = [([0] * months, [0] * months) for _ in range(currency_count)]
+        for (code, yearly, offset), cents in groups.items():
+            first_bills[code][yearly][offset] += cents
+        series = []
+        for monthly, yearly in first_bills:
+            # A monthly bill repeats every month after its first, a yearly one every 12
+            for i in range(1, months):
+                monthly[i] += monthly[i - 1]
+            for i in range(12, months):
+                yearly[i] += yearly[i - 12]
+            series.append([m + y for m, y in zip(monthly, yearly)])
+        return series, service_cents
+
+    def _sum_numpy(self, numpy, columns, currency_count, months):
+        _, _, codes, yearly_flags, prices, offsets = columns
+        codes = numpy.array(codes, dtype=numpy.int64)
+        yearly = numpy.array(yearly_flags, dtype=bool)
+        cents = numpy.array(prices, dtype=numpy.int64)
+        offsets = numpy.array(offsets, dtype=numpy.int64)
+
+        bills = numpy.where(yearly, (months - 1 - offsets) // 12 + 1, months - offsets)
+        service_cents = cents * bills
+
+        # One bincount per cycle covers every currency: bucket = code * months + offset
+        buckets = codes * months + offsets
+        size = currency_count * months
+        first_monthly = numpy.bincount(buckets[~yearly], weights=cents[~yearly], minlength=size)
+        first_yearly = numpy.bincount(buckets[yearly], weights=cents[yearly], minlength=size)
+        monthly = first_monthly.reshape(currency_count, months).astype(numpy.int64).cumsum(axis=1)
+        # Pad to whole years so each month of the year is a column to cumsum down
+        years = -(-months // 12)
+        padded = numpy.zeros((currency_count, years * 12), dtype=numpy.int64)
+        padded[:, :months] = first_yearly.reshape(currency_count, months)
+        yearly_spend = padded.reshape(currency_count, years, 12).cumsum(axis=1)
+        yearly_spend = yearly_spend.reshape(currency_count, years * 12)[:, :months]
+        return (monthly + yearly_spend).tolist(), service_cents.tolist()
+
+    def _convert(self, start, months, currency, top, columns, currencies, series, service_cents):
+        ids, names, codes = columns[:3]
+        spend = [Decimal(0)] * months
+        unconverted = []
+        factors = [None] * len(currencies)
+        for code, source in enumerate(currencies):
+            factor = self.rates.convert(Decimal(1), source, currency)
+            if factor is None:
+                unconverted.append(source)
+                continue
+            factors[code] = factor
+            spend = [total + Decimal(cents) * factor / 100 for total, cents in zip(spend, series[code])]
+        exact_total = sum(spend, Decimal(0))
+        spend = [amount.quantize(CENT, rounding=ROUND_HALF_UP) for amount in spend]
+        cumulative = []
+        running = Decimal(0)
+        for amount in spend:
+            running += amount
+            cumulative.append(running)
+
+        # Rank with floats, only the top ones get exact Decimal totals
+        float_factors = [float(f) if f is not None else 0.0 for f in factors]
+        ranked = heapq.nlargest(top, range(len(ids)),
+                                key=lambda i: service_cents[i] * float_factors[codes[i]])
+        services = []
+        exact_other = exact_total
+        for i in ranked:
+            factor = factors[codes[i]]
+            if factor is None or not service_cents[i]:
+                continue
+            amount = Decimal(service_cents[i]) * factor / 100
+            exact_other -= amount
+            services.append((ids[i], names[i], amount.quantize(CENT)))
+        # From the unrounded amounts: the rounded ones leave stray cents
+        other = max(exact_other, Decimal(0)).quantize(CENT, rounding=ROUND_HALF_UP)
+        return {
+            "currency": currency,
+            "months": [month_label(start + i) for i in range(months)],
+            "spend": spend,
+            "cumulative": cumulative,
+            "services": services,
+            "other": other if months else Decimal(0),
+            "unconverted": sorted(unconverted),
+        }
+
+
+def monthly_cost(sub):
+    return sub["price"] if sub.get("cycle") == "Monthly" else sub["price"] / 12
+
+
+class SearchIndex:
+    """Name search and pre-sorted views over the ledger.
+
+    Names are indexed by lowercase trigram, so a query of three or more
+    characters only verifies the rows sharing its rarest trigram, and by
+    the sorted name view for shorter prefix queries. One sorted list per
+    sort key is kept alongside. Everything is patched per add/remove, so
+    filtering never rescans the ledger.
+    """
+
+    SORT_KEYS = {
+        "order": None,  # ledger (insertion) order
+        "name": lambda sub: sub["name"].lower(),
+        "price": lambda sub: sub["price"],
+        "monthly": monthly_cost,
+        "date_added": lambda sub: sub.get("date_added") or "",
+    }
+    # Position of each sort's key in the per-row tuple of keys
+    SLOTS = {sort: i for i, sort in enumerate(SORT_KEYS)}
+
+    def __init__(self, subscriptions=()):
+        self._trigrams = {}
+        self._sorted = {key: [] for key in self.SORT_KEYS}
+        # id -> tuple of the row's key in each sorted list, in SORT_KEYS
+        # order. A tuple rather than a dict: at 100k rows the dicts alone
+        # were a quarter of the store.
+        self._keys = {}
+        self._seq = 0
+        # Bulk build: append everything, sort each list once
+        for sub in subscriptions:
+            self._index(sub, self._seq, insert=list.append)
+            self._seq += 1
+        for entries in self._sorted.values():
+            entries.sort()
+
+    @staticmethod
+    def _trigrams_of(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _name_of(self, sub_id):
+        return self._keys[sub_id][self.SLOTS["name"]][0]
+
+    def add(self, sub):
+        sub_id = sub["id"]
+        seq = self._keys[sub_id][self.SLOTS["order"]][0] if sub_id in self._keys else None
+        self.remove(sub_id)
+        if seq is None:
+            seq = self._seq
+            self._seq += 1
+        self._index(sub, seq, insert=bisect.insort)
+
+    def _index(self, sub, seq, insert):
+        sub_id = sub["id"]
+        order = (seq, sub_id)
+        keys = tuple(order if key_func is None else (key_func(sub), seq, sub_id)
+                     for key_func in self.SORT_KEYS.values())
+        for key, entries in zip(keys, self._sorted.values()):
+            insert(entries, key)
+        for trigram in self._trigrams_of(keys[self.SLOTS["name"]][0]):
+            self._trigrams.setdefault(trigram, set()).add(sub_id)
+        self._keys[sub_id] = keys
+
+    def remove(self, sub_id):
+        keys = self._keys.pop(sub_id, None)
+        if keys is None:
+            return
+        for trigram in self._trigrams_of(keys[self.SLOTS["name"]][0]):
+            ids = self._trigrams.get(trigram)
+            if ids is not None:
+                ids.discard(sub_id)
+                if not ids:
+                    del self._trigrams[trigram]
+        for key, entries in zip(keys, self._sorted.values()):
+            self._remove_sorted(entries, key)
+
+    @staticmethod
+    def _remove_sorted(entries, key):
+        i = bisect.bisect_left(entries, key)
+        if i < len(entries) and entries[i] == key:
+            del entries[i]
+
+    def search(self, text):
+        """Ids of subscriptions whose name contains text (case-insensitive)."""
+        text = text.strip().lower()
+        if len(text) < 3:
+            # Too short for trigrams, match name prefixes instead
+            names = self._sorted["name"]
+            lo = bisect.bisect_left(names, (text,))
+            hi = bisect.bisect_left(names, (text + "\uffff",))
+            return {key[-1] for key in names[lo:hi]}
+        postings = [self._trigrams.get(t, ()) for t in self._trigrams_of(text)]
+        candidates = min(postings, key=len)
+        return {sub_id for sub_id in candidates if text in self._name_of(sub_id)}
+
+    def view(self, sort="order", text=None, descending=False):
+        """Ids sorted by sort, optionally only those matching text."""
+        entries = self._sorted[sort]
+        if text and text.strip():
+            matches = self.search(text)
+            if len(matches) * 8 < len(entries):
+                # Few matches: sorting them beats walking the whole view
+                slot = self.SLOTS[sort]
+                keyed = sorted(self._keys[sub_id][slot] for sub_id in matches)
+                ids = [key[-1] for key in keyed]
+            else:
+                ids = [key[-1] for key in entries if key[-1] in matches]
+        else:
+            ids = [key[-1] for key in entries]
+        if descending:
+            ids.reverse()
+        return ids
+
+    def __len__(self):
+        return len(self._keys)
+
+
+SEARCH_FIELDS = ("name", "price", "cycle", "date_added")
+
+# GUI sort menu label -> (SearchIndex sort key, descending)
+SORT_OPTIONS = {
+    "Added order": ("order", False),
+    "Name": ("name", False),
+    "Price (high-low)": ("price", True),
+    "Monthly cost (high-low)": ("monthly", True),
+    "Newest first": ("date_added", True),
+}
+
+
+NOTIFICATION_LEAD_DAYS = {"1 day": 1, "3 days": 3, "1 week": 7, "2 weeks": 14}
+
+
+def desktop_notifications_available():
+    import shutil
+    return sys.platform == "darwin" or shutil.which("notify-send") is not None
+
+
+def send_desktop_notification(title, message):
+    """Best-effort OS notification. Returns False if nothing could show it.
+
+    Can block for a few seconds, keep it off the Tk thread.
+    """
+    import subprocess
+    import shutil
+    try:
+        if sys.platform == "darwin":
+            script = f"display notification {json.dumps(message)} with title {json.dumps(title)}"
+            subprocess.run(["osascript", "-e", script], check=False, timeout=5)
+            return True
+        if shutil.which("notify-send"):
+            subprocess.run(["notify-send", title, message], check=False, timeout=5)
+            return True
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return False
+
+
+def renewal_key(sub_id, renewal):
+    return f"{sub_id}:{renewal.isoformat()}"
+
+
+class RenewalScheduler:
+    """Background thread that fires notify([(renewal, sub), ...]) for upcoming
+    renewals, once per check with everything newly due.
+
+    Rather than polling, it works out when the next subscription enters the
+    notification window (or the next midnight, whichever is sooner) and
+    sleeps until then. wake() makes it recheck immediately, e.g. after an
+    edit or a settings change. Each renewal is announced once: notified is
+    the set of renewal_key()s already announced, pass the same set to a
+    restarted scheduler to keep them quiet. renewals may also be a function
+    returning the current index, for a store that rebuilds it.
+    """
+
+    def __init__(self, renewals, lead_days, notify, notified=None):
+        self._renewals = renewals if callable(renewals) else (lambda: renewals)
+        self.lead_days = lead_days
+        self.notify = notify
+        self._notified = set() if notified is None else notified
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="subber-renewals", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop = True
+        self._wake.set()
+
+    def check(self, today=None):
+        today = today or date.today()
+        due = []
+        for renewal, sub in self._renewals().due_within(self.lead_days, today):
+            key = renewal_key(sub["id"], renewal)
+            if key not in self._notified:
+                self._notified.add(key)
+                due.append((renewal, sub))
+        if due:
+            self.notify(due)
+
+    def seconds_until_next(self, now=None):
+        now = now or datetime.now()
+        today = now.date()
+        wake_day = today + timedelta(days=1)
+        upcoming = self._renewals().first_after(today + timedelta(days=self.lead_days))
+        if upcoming is not None:
+            wake_day = min(wake_day, upcoming[0] - timedelta(days=self.lead_days))
+        wake_at = datetime.combine(wake_day, datetime.min.time())
+        return max(1.0, (wake_at - now).total_seconds())
+
+    def _run(self):
+        while not self._stop:
+            self.check()
+            self._wake.wait(self.seconds_until_next())
+            self._wake.clear()
+
+
+class FileLock:
+    """Advisory lock held on a sidecar .lock file, shared by every process
+    using the same ledger. Re-entrant within one process."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+        self._thread_lock = threading.RLock()
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                if os.name == "nt":
+                    import msvcrt
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                else:
+                    import fcntl
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            if os.name == "nt":
+                import msvcrt
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+
+def file_signature(path):
+    """(inode, mtime, size) to notice a file being replaced, or None."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+# Batches at least this big (and an eighth of the ledger) rebuild the indexes
+# once instead of patching them per record
+BULK_APPLY_MIN = 64
+
+
+class SubscriptionStore:
+    """Snapshot plus append-only operation log for the subscription ledger.
+
+    subscriptions.json holds a snapshot and subscriptions.log one JSON record
+    per add, update or delete made since. A single edit therefore costs one
+    small fsynced append instead of rewriting the ledger. Once the log holds
+    compact_every records it is folded into a new snapshot, written with
+    atomic_write, and truncated. Replay is idempotent so a crash between
+    those two steps is harmless.
+
+    Several processes may share one ledger. Every write happens under a
+    FileLock and first replays whatever other processes appended since we
+    last looked, and poll_changes() does the same on demand. A snapshot
+    replaced by someone else's compaction is diffed against memory by id,
+    so either way only the changed subscriptions are touched.
+    """
+
+    def __init__(self, path=None, compact_every=500):
+        self.path = path or default_subscriptions_path()
+        self.log_path = os.path.splitext(self.path)[0] + ".log"
+        self.compact_every = compact_every
+        self.icon_store = icon_store_for(self.path)
+        self.by_id = {}
+        self.aggregator = TotalsAggregator()
+        self._renewals = None
+        self._search = None
+        self._log = None
+        self._log_records = 0
+        self._file_lock = FileLock(os.path.splitext(self.path)[0] + ".lock")
+        self._snapshot_sig = None
+        self._log_offset = 0
+        self._external_events = []
+        self._loaded = False
+        self.revision = 0
+
+    @property
+    def subscriptions(self):
+        """The ledger in order. by_id is the real container: a dict keeps
+        insertion order and deletes from it are O(1)."""
+        return list(self.by_id.values())
+
+    def _read_snapshot(self):
+        """(rows, schema version) of the snapshot on disk."""
+        try:
+            with open(self.path, "r") as f:
+                return ledger_rows(json.load(f))
+        except FileNotFoundError:
+            return [], SCHEMA_VERSION
+
+    def _read_log(self, offset, truncate_torn=False):
+        """Records appended after offset and the offset they end at."""
+        records = []
+        try:
+            f = open(self.log_path, "rb")
+        except FileNotFoundError:
+            return records, 0
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Torn write from a crash, nothing after it is valid
+                    break
+                offset += len(line)
+        if truncate_torn and offset != os.path.getsize(self.log_path):
+            with open(self.log_path, "r+b") as f:
+                f.truncate(offset)
+        return records, offset
+
+    def load(self):
+        with self._file_lock:
+            self._snapshot_sig = file_signature(self.path)
+            rows, version = self._read_snapshot()
+            records, self._log_offset = self._read_log(0, truncate_torn=True)
+            self._external_events = []
+
+            # Version 1 ledgers may predate ids
+            changed = assign_subscription_ids(rows)
+            self.by_id = {}
+            for sub in rows:
+                self._put(sub)
+            for record in records:
+                self._apply(record, index=False)
+            self._rebuild_indexes()
+            # One-time migration of hex icons into the icon store
+            changed = migrate_icon_fields(self.by_id.values(), self.icon_store) or changed
+            if changed or version < SCHEMA_VERSION or len(records) >= self.compact_every:
+                self._write_snapshot()
+            else:
+                self._log_records = len(records)
+            self._loaded = True
+        return self.subscriptions
+
+    def ensure_loaded(self):
+        """load() unless that already happened, e.g. in run_command."""
+        if not self._loaded:
+            self.load()
+
+    def _catch_up(self):
+        """Apply what other processes wrote since we last looked. Call with
+        the file lock held."""
+        if file_signature(self.path) != self._snapshot_sig:
+            self._merge_fresh_state()
+            return
+        try:
+            log_size = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            log_size = 0
+        if log_size < self._log_offset:
+            self._merge_fresh_state()
+        elif log_size > self._log_offset:
+            records, self._log_offset = self._read_log(self._log_offset)
+            self._apply_all(records)
+            self._external_events.extend((record["op"], record.get("id") or record["sub"]["id"])
+                                         for record in records)
+            self._log_records += len(records)
+
+    def _merge_fresh_state(self):
+        # Someone compacted: rebuild their view and diff it against ours
+        self._snapshot_sig = file_signature(self.path)
+        fresh = OrderedDict((sub["id"], sub) for sub in self._read_snapshot()[0] if sub.get("id"))
+        records, self._log_offset = self._read_log(0)
+        for record in records:
+            if record["op"] == "add":
+                fresh[record["sub"]["id"]] = record["sub"]
+            elif record["op"] == "update" and record["id"] in fresh:
+                fresh[record["id"]].update(record["changes"])
+            elif record["op"] == "delete":
+                fresh.pop(record["id"], None)
+        self._log_records = len(records)
+        self._external_events.extend(self._merge(list(fresh.values())))
+
+    def _merge(self, fresh_subs):
+        """Bring memory in line with fresh_subs, touching only what differs."""
+        records = []
+        fresh_ids = {sub["id"] for sub in fresh_subs}
+        for sub_id in [sub_id for sub_id in self.by_id if sub_id not in fresh_ids]:
+            records.append({"op": "delete", "id": sub_id})
+        for sub in fresh_subs:
+            current = self.by_id.get(sub["id"])
+            if current is None:
+                records.append({"op": "add", "sub": sub})
+            elif current != sub:
+                changes = {k: v for k, v in sub.items() if current.get(k) != v}
+                records.append({"op": "update", "id": sub["id"], "changes": changes})
+        self._apply_all(records)
+        return [(record["op"], record.get("id") or record["sub"]["id"]) for record in records]
+
+    def poll_changes(self):
+        """Merge in changes made by other processes.
+
+        Returns [(op, id)] for everything that changed since the last call,
+        cheap (two stats) when nothing did.
+        """
+        try:
+            log_size = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            log_size = 0
+        if (not self._external_events and log_size == self._log_offset
+                and file_signature(self.path) == self._snapshot_sig):
+            return []
+        with self._file_lock:
+            self._catch_up()
+        events, self._external_events = self._external_events, []
+        return events
+
+    def _put(self, sub):
+        """Insert or replace sub (which must have an id), returning the stored record."""
+        existing = self.by_id.get(sub["id"])
+        if existing is not None:
+            existing.clear()
+            existing.update(sub)
+            return existing
+        sub = Subscription(sub)
+        self.by_id[sub["id"]] = sub
+        return sub
+
+    def _rebuild_indexes(self):
+        self.revision += 1
+        self.aggregator = TotalsAggregator(self.by_id.values())
+        # Rebuilt on first use, most commands never query them
+        self._renewals = None
+        self._search = None
+
+    @property
+    def renewals(self):
+        """RenewalIndex over the ledger, built on first use."""
+        renewals = self._renewals
+        if renewals is None:
+            # list() copies in one go, the scheduler thread may get here first
+            renewals = self._renewals = RenewalIndex(list(self.by_id.values()))
+        return renewals
+
+    @property
+    def search(self):
+        """SearchIndex over the ledger, built on first use."""
+        if self._search is None:
+            self._search = SearchIndex(list(self.by_id.values()))
+        return self._search
+
+    def _apply(self, record, index=True):
+        # Bumped on every change, the sync server uses it as its ETag
+        self.revision += 1
+        op = record.get("op")
+        if not index:
+            # The caller rebuilds the indexes once it's done
+            if op == "add":
+                self._put(record["sub"])
+            elif op == "update" and record["id"] in self.by_id:
+                self.by_id[record["id"]].update(record["changes"])
+            elif op == "delete":
+                self.by_id.pop(record["id"], None)
+        elif op == "add":
+            sub = self._put(record["sub"])
+            self.aggregator.add(sub)
+            if self._renewals is not None:
+                self._renewals.add(sub)
+            if self._search is not None:
+                self._search.add(sub)
+        elif op == "update":
+            sub = self.by_id.get(record["id"])
+            if sub is not None:
+                changes = record["changes"]
+                sub.update(changes)
+                self.aggregator.add(sub)
+                if self._renewals is not None and ("date_added" in changes or "cycle" in changes):
+                    self._renewals.add(sub)
+                if self._search is not None and any(field in changes for field in SEARCH_FIELDS):
+                    self._search.add(sub)
+        elif op == "delete":
+            self.by_id.pop(record["id"], None)
+            self.aggregator.remove(record["id"])
+            if self._renewals is not None:
+                self._renewals.remove(record["id"])
+            if self._search is not None:
+                self._search.remove(record["id"])
+
+    @staticmethod
+    def _check_records(records):
+        """Check every record before any is applied, so a bad one can't
+        leave memory half changed and out of step with the file."""
+        for record in records:
+            op = record.get("op")
+            if op == "add":
+                fields = record["sub"]
+                if not isinstance(fields.get("id"), str) or not fields["id"]:
+                    raise ValueError("add needs an id")
+            elif op == "update":
+                fields = record["changes"]
+            elif op == "delete":
+                continue
+            else:
+                raise ValueError(f"unknown op {op!r}")
+            if "price" in fields:
+                fields["price"] = check_price(fields["price"])
+
+    def _apply_all(self, records):
+        """_apply each record. A big batch is applied without touching the
+        indexes and they are rebuilt once after, sorted inserts one record
+        at a time would make it quadratic."""
+        bulk = len(records) >= BULK_APPLY_MIN and len(records) * 8 >= len(self.by_id)
+        for record in records:
+            self._apply(record, index=not bulk)
+        if bulk:
+            self._rebuild_indexes()
+
+    def _commit(self, records):
+        """Apply records and persist them as one write, after catching up
+        with other processes so nothing of theirs is overwritten."""
+        self._check_records(records)
+        with self._file_lock:
+            self._catch_up()
+            self._apply_all(records)
+            if len(records) >= self.compact_every:
+                self._write_snapshot()
+            elif records:
+                self._append(records)
+
+    def _append(self, records):
+        if self._log is None:
+            self._log = open(self.log_path, "a", encoding="utf-8")
+        with diag.span("io.log_append"):
+            self._log.write("".join(json.dumps(r, default=json_default) + "\n" for r in records))
+            self._log.flush()
+            os.fsync(self._log.fileno())
+        size = os.fstat(self._log.fileno()).st_size
+        diag.count("io.bytes_written", size - self._log_offset)
+        self._log_offset = size
+        self._log_records += len(records)
+        if self._log_records >= self.compact_every:
+            self._write_snapshot()
+
+    def add(self, sub):
+        sub.setdefault("id", new_subscription_id())
+        self._commit([{"op": "add", "sub": sub}])
+        return self.get(sub["id"])
+
+    def update(self, sub_id, changes):
+        if self.get(sub_id) is None:
+            return None
+        self._commit([{"op": "update", "id": sub_id, "changes": changes}])
+        return self.get(sub_id)
+
+    def delete(self, sub_id):
+        sub = self.get(sub_id)
+        if sub is None:
+            return None
+        self._commit([{"op": "delete", "id": sub_id}])
+        return sub
+
+    def apply_batch(self, records):
+        """Apply many records as one commit: a single log append, or straight
+        to a new snapshot when the batch is big enough to trigger one anyway."""
+        self._commit(records)
+
+    def add_many(self, subs):
+        records = []
+        for sub in subs:
+            sub.setdefault("id", new_subscription_id())
+            records.append({"op": "add", "sub": sub})
+        self.apply_batch(records)
+        return len(records)
+
+    def get(self, sub_id):
+        return self.by_id.get(sub_id)
+
+    def iter_subscriptions(self):
+        return iter(self.subscriptions)
+
+    def query(self, name=None, cycle=None, offset=0, limit=None):
+        """(number of matches, the page of matches from offset) in ledger order."""
+        needle = name.lower() if name else None
+        total = 0
+        page = []
+        for sub in self.by_id.values():
+            if needle and needle not in sub["name"].lower():
+                continue
+            if cycle and sub.get("cycle") != cycle:
+                continue
+            if total >= offset and (limit is None or len(page) < limit):
+                page.append(sub)
+            total += 1
+        return total, page
+
+    def totals(self):
+        """(monthly, yearly) cost of the whole ledger."""
+        return self.aggregator.totals()
+
+    def breakdown(self):
+        return self.aggregator.breakdown()
+
+    def replace_all(self, subscriptions):
+        """Swap in a whole new ledger and write it as the snapshot."""
+        with self._file_lock:
+            self.by_id = {}
+            assign_subscription_ids(subscriptions)
+            for sub in subscriptions:
+                self._put(sub)
+            self._rebuild_indexes()
+            self._write_snapshot()
+
+    def compact(self):
+        """Fold the log into a fresh snapshot and truncate it."""
+        with self._file_lock:
+            self._catch_up()
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        atomic_write(self.path, ledger_document(self.by_id.values()))
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "w"):
+                pass
+        self._snapshot_sig = file_signature(self.path)
+        self._log_offset = 0
+        self._log_records = 0
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+DEFAULT_SETTINGS = {
+    "scaling_factor": 1.0,
+    "appearance_mode": "dark",
+    "hue": 200,  # Default blue-ish hue
+    "notifications_enabled": False,
+    "notification_when": "3 days",
+    "notification_push": False,
+    "notification_custom_text": "Your subscription is due soon!",
+    "notified_renewals": [],  # renewal_key()s already announced
+    "icon_cache_size": 256,
+    "server_url": "",  # e.g. http://127.0.0.1:8765 to use a LittleSubber serve instance
+    "diagnostics_enabled": False,
+    "display_currency": "USD"
+}
+
+
+class SettingsStore(dict):
+    """settings.json kept in memory with debounced, atomic writes.
+
+    Setting a key only marks the store dirty; save() schedules a single flush
+    delay ms after the last change, so dragging a slider or typing in an
+    entry costs one write instead of one per event. Defaults are merged in
+    memory and never written back on their own.
+
+    A flush re-reads the file under a lock and writes back only the keys
+    changed here, so two running instances don't undo each other's settings.
+    """
+
+    def __init__(self, path=None, delay=500):
+        super().__init__(DEFAULT_SETTINGS)
+        self.path = path or os.path.join(os.path.dirname(__file__), "settings.json")
+        self.delay = delay
+        self._dirty = False
+        self._dirty_keys = set()
+        self._timer = None
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(os.path.splitext(self.path)[0] + ".lock")
+        self._after = None
+        self._after_cancel = None
+        try:
+            with open(self.path, "r") as f:
+                super().update(json.load(f))
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def use_scheduler(self, after, after_cancel):
+        """Schedule flushes on the Tk loop (widget.after) instead of a thread."""
+        self._after = after
+        self._after_cancel = after_cancel
+
+    def __setitem__(self, key, value):
+        if key in self and self[key] == value:
+            return
+        super().__setitem__(key, value)
+        self._dirty = True
+        self._dirty_keys.add(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def save(self):
+        if not self._dirty:
+            return
+        with self._lock:
+            if self._timer is not None:
+                if self._after_cancel is not None:
+                    self._after_cancel(self._timer)
+                else:
+                    self._timer.cancel()
+            if self._after is not None:
+                self._timer = self._after(self.delay, self.flush)
+            else:
+                self._timer = threading.Timer(self.delay / 1000, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            changes = {key: self[key] for key in self._dirty_keys}
+            self._dirty_keys = set()
+        with self._file_lock:
+            try:
+                with open(self.path, "r") as f:
+                    on_disk = json.load(f)
+            except (FileNotFoundError, ValueError):
+                on_disk = {}
+            on_disk.update(changes)
+            atomic_write(self.path, json.dumps(on_disk))
+        # Pick up whatever the other instances saved
+        for key, value in on_disk.items():
+            if key not in self._dirty_keys:
+                super().__setitem__(key, value)
+
+
+ICON_SIZE = (24, 24)
+# One pre-scaled copy per Display Scaling choice (75% to 300%)
+ICON_SCALES = tuple(i / 4 for i in range(3, 13))
+ICON_VARIANT_SIZES = tuple(sorted({round(ICON_SIZE[0] * scale) for scale in ICON_SCALES} - {ICON_SIZE[0]}))
+
+
+def best_frame(image, size):
+    """For ICO/ICNS files holding several sizes, select the smallest frame
+    that is at least size pixels, or the largest one if none is."""
+    # ICO lists (w, h), ICNS lists (w, h, scale) for a frame of w*scale pixels
+    frames = sorted((entry[0] * entry[2], entry[1] * entry[2], entry) if len(entry) == 3
+                    else (entry[0], entry[1], entry)
+                    for entry in image.info.get("sizes") or ())
+    if len(frames) > 1:
+        large_enough = [frame for frame in frames if min(frame[:2]) >= size]
+        width, height, entry = large_enough[0] if large_enough else frames[-1]
+        if len(entry) == 3:
+            image.best_size = entry
+        image.size = (width, height)
+    image.load()
+    return image
+
+
+def compact_png(image):
+    """Smallest lossless PNG encoding of an RGBA image."""
+    from PIL import Image
+    out = io.BytesIO()
+    image.save(out, format="PNG", optimize=True)
+    best = out.getvalue()
+    # Icons rarely use more than 256 colours, a palette PNG is then exact and much smaller
+    colours = image.getcolors(256)
+    if colours is not None:
+        palette = image.quantize(colors=len(colours), method=Image.Quantize.FASTOCTREE)
+        if palette.convert("RGBA").tobytes() == image.tobytes():
+            out = io.BytesIO()
+            palette.save(out, format="PNG", optimize=True)
+            if out.tell() < len(best):
+                best = out.getvalue()
+    return best
+
+
+def encode_icon_variants(data, sizes=ICON_VARIANT_SIZES):
+    """Raw icon bytes -> (ICON_SIZE PNG, {pixels: PNG}), or None if they
+    can't be decoded.
+
+    The best frame is decoded once and scaled down to each size; sizes
+    bigger than the source are skipped, upscaling is left to display time.
+    Runs in the icon process pool, so it must only depend on its arguments.
+    """
+    try:
+        from PIL import Image
+        source = best_frame(Image.open(io.BytesIO(data)), max((ICON_SIZE[0],) + tuple(sizes)))
+        source = source.convert("RGBA")
+        base = compact_png(source.resize(ICON_SIZE, Image.LANCZOS))
+        variants = {size: compact_png(source.resize((size, size), Image.LANCZOS))
+                    for size in sizes if size <= min(source.size)}
+        return base, variants
+    except Exception as e:
+        print(f"Error storing icon: {e}")
+        return None
+
+
+def encode_icon(data):
+    """Raw icon bytes -> ICON_SIZE PNG bytes, or None if they can't be decoded."""
+    with diag.span("icon.encode"):
+        encoded = encode_icon_variants(data, ())
+    return encoded[0] if encoded else None
+
+
+class IconPipeline:
+    """Encodes icons in a process pool so decoding and resizing big
+    favicons never competes with the Tk thread for the GIL.
+
+    The pool uses the spawn start method (forking a process that runs Tk
+    and threads isn't safe) and is only started on first use. If it can't
+    start, encoding stays in the calling thread. A pool broken by a dying
+    worker is dropped and a fresh one started on the next call.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self._pool = None
+        self._unavailable = False
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        """The pool, started if needed, or None if processes can't be used."""
+        with self._lock:
+            if self._pool is None and not self._unavailable:
+                try:
+                    import multiprocessing
+                    from concurrent.futures import ProcessPoolExecutor
+                    self._pool = ProcessPoolExecutor(self.max_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+                except (OSError, ImportError, NotImplementedError) as e:
+                    print(f"Icon pool unavailable, encoding in process: {e}")
+                    self._unavailable = True
+            return self._pool
+
+    def _drop(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def encode(self, data):
+        return self.encode_many([data])[0]
+
+    def encode_many(self, items):
+        """encode_icon_variants for each item, spread over the pool."""
+        from concurrent.futures.process import BrokenProcessPool
+        with diag.span("icon.encode"):
+            pool = self._executor()
+            if pool is not None:
+                try:
+                    return list(pool.map(encode_icon_variants, items))
+                except BrokenProcessPool as e:
+                    # A worker died, e.g. killed for memory; the pool can't be reused
+                    print(f"Icon pool broke, encoding in process: {e}")
+                    self._drop(pool)
+            return [encode_icon_variants(data) for data in items]
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+class IconStore:
+    """Content-addressed store of pre-resized icon PNGs.
+
+    Icons live as <sha1>.png files in a directory next to subscriptions.json,
+    so the JSON only carries a short "icon_id" instead of the raw favicon hex.
+    Each icon also gets <sha1>@<pixels>.png copies for the larger display
+    scalings. The id is the hash of the base PNG, so services sharing an
+    icon share the files, and raw icons already seen aren't encoded again.
+    stats counts how much that saves.
+    """
+
+    def __init__(self, directory, pipeline=None):
+        self.directory = directory
+        self.pipeline = pipeline
+        self._by_source = {}
+        self.stats = {"icons": 0, "duplicates": 0, "raw_bytes": 0, "stored_bytes": 0}
+
+    def path(self, icon_id, size=None):
+        name = icon_id if size is None else f"{icon_id}@{size}"
+        return os.path.join(self.directory, f"{name}.png")
+
+    def has(self, icon_id, size=None):
+        return os.path.exists(self.path(icon_id, size))
+
+    def read(self, icon_id, size=None):
+        """Stored PNG bytes, or None."""
+        try:
+            with open(self.path(icon_id, size), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, icon_id, png, size=None):
+        os.makedirs(self.directory, exist_ok=True)
+        atomic_write(self.path(icon_id, size), png)
+
+    def remove(self, icon_id):
+        for size in (None,) + ICON_VARIANT_SIZES:
+            try:
+                os.remove(self.path(icon_id, size))
+            except FileNotFoundError:
+                pass
+
+    def put(self, data):
+        """Encode raw icon bytes once and store them. Returns the icon id."""
+        return self.put_many([data])[0]
+
+    def put_many(self, items):
+        """put() for several raw icons, encoded in parallel when there's a pipeline."""
+        ids = [None] * len(items)
+        todo = []
+        for i, data in enumerate(items):
+            source = hashlib.sha1(data).hexdigest()
+            if source in self._by_source:
+                ids[i] = self._by_source[source]
+                self._count(len(data), 0, duplicate=True)
+            else:
+                todo.append((i, source, data))
+        if self.pipeline is not None:
+            results = self.pipeline.encode_many([data for _, _, data in todo])
+        else:
+            results = [encode_icon_variants(data) for _, _, data in todo]
+        for (i, source, data), encoded in zip(todo, results):
+            if encoded is None:
+                continue
+            ids[i] = self._by_source[source] = self.put_encoded(*encoded, raw_bytes=len(data))
+        return ids
+
+    def put_encoded(self, base, variants, raw_bytes=0):
+        icon_id = hashlib.sha1(base).hexdigest()
+        if self.has(icon_id):
+            # Another service already uses the same icon
+            self._count(raw_bytes, 0, duplicate=True)
+            return icon_id
+        self.write(icon_id, base)
+        for size, png in variants.items():
+            self.write(icon_id, png, size)
+        self._count(raw_bytes, len(base) + sum(map(len, variants.values())))
+        return icon_id
+
+    def put_png(self, png):
+        icon_id = hashlib.sha1(png).hexdigest()
+        if not self.has(icon_id):
+            self.write(icon_id, png)
+        return icon_id
+
+    def _count(self, raw_bytes, stored_bytes, duplicate=False):
+        self.stats["icons"] += 1
+        self.stats["duplicates"] += duplicate
+        self.stats["raw_bytes"] += raw_bytes
+        self.stats["stored_bytes"] += stored_bytes
+        diag.count("icons.raw_bytes", raw_bytes)
+        diag.count("icons.stored_bytes", stored_bytes)
+        if duplicate:
+            diag.count("icons.deduplicated")
+
+    def open(self, icon_id, size=None):
+        """The icon as a PIL image, the copy made for size pixels if there is one."""
+        from PIL import Image
+        png = self.read(icon_id, size) if size and size != ICON_SIZE[0] else None
+        if png is None:
+            png = self.read(icon_id)
+        if png is None:
+            raise FileNotFoundError(icon_id)
+        image = Image.open(io.BytesIO(png))
+        image.load()
+        return image
+
+
+def icon_store_for(subs_path):
+    return IconStore(os.path.join(os.path.dirname(subs_path), "icons"))
+
+
+def migrate_icon_fields(subscriptions, icon_store):
+    """Move legacy hex "icon" fields into the icon store. Returns True if any
+    subscription changed."""
+    changed = False
+    pillow = None
+    for sub in subscriptions:
+        if "icon" not in sub:
+            continue
+        try:
+            data = bytes.fromhex(sub["icon"])
+        except (TypeError, ValueError):
+            data = b""
+        icon_id = icon_store.put(data) if data else None
+        if icon_id is not None:
+            sub["icon_id"] = icon_id
+            del sub["icon"]
+            changed = True
+            continue
+        if data and pillow is None:
+            import importlib.util
+            pillow = importlib.util.find_spec("PIL") is not None
+        # Not hex, or not an image Pillow can read: drop it rather than try
+        # again on every load. Without Pillow it is kept for later.
+        if not data or pillow:
+            del sub["icon"]
+            changed = True
+    return changed
+
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+SQLITE_COLUMNS = ("id", "name", "price", "cycle", "website", "date_added", "icon_id")
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    cycle TEXT NOT NULL,
+    website TEXT,
+    date_added TEXT,
+    icon_id TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS subscriptions_name ON subscriptions (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS subscriptions_cycle ON subscriptions (cycle);
+CREATE INDEX IF NOT EXISTS subscriptions_date_added ON subscriptions (date_added);
+CREATE TABLE IF NOT EXISTS icons (
+    id TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+"""
+
+
+class SqliteIconStore(IconStore):
+    """IconStore keeping the PNGs in the database's icons table, with the
+    scaled copies stored under "<id>@<pixels>"."""
+
+    def __init__(self, conn, lock, pipeline=None):
+        super().__init__(None, pipeline)
+        self._conn = conn
+        self._lock = lock
+
+    @staticmethod
+    def _key(icon_id, size):
+        return icon_id if size is None else f"{icon_id}@{size}"
+
+    def has(self, icon_id, size=None):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM icons WHERE id = ?",
+                                      (self._key(icon_id, size),)).fetchone() is not None
+
+    def read(self, icon_id, size=None):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM icons WHERE id = ?",
+                                     (self._key(icon_id, size),)).fetchone()
+        return row[0] if row else None
+
+    def write(self, icon_id, png, size=None):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO icons (id, data) VALUES (?, ?)",
+                               (self._key(icon_id, size), png))
+
+    def remove(self, icon_id):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM icons WHERE id = ?",
+                                   [(self._key(icon_id, size),) for size in (None,) + ICON_VARIANT_SIZES])
+
+
+class SqliteSubscriptionStore(SubscriptionStore):
+    """SubscriptionStore with the same API, backed by an indexed SQLite file.
+
+    Every add/update/delete is its own small transaction, totals come from
+    SQL aggregates and icons live in a separate table, so large ledgers don't
+    have to be loaded to be queried.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.log_path = None
+        self.compact_every = 0
+        self.by_id = {}
+        self.aggregator = TotalsAggregator()
+        self._renewals = None
+        self._search = None
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._data_version = None
+        self.revision = 0
+        import sqlite3
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+        self.icon_store = SqliteIconStore(self._conn, self._lock)
+
+    @staticmethod
+    def _row_to_sub(row):
+        sub = Subscription(zip(SQLITE_COLUMNS, row))
+        if row[-1]:
+            sub.update(json.loads(row[-1]))
+        return sub
+
+    @staticmethod
+    def _sub_to_row(sub):
+        extra = {key: value for key, value in sub.items() if key not in SQLITE_COLUMNS}
+        return tuple(sub.get(key) for key in SQLITE_COLUMNS) + (json.dumps(extra) if extra else None,)
+
+    def load(self):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(SQLITE_COLUMNS)}, extra FROM subscriptions ORDER BY rowid").fetchall()
+        self.by_id = {sub["id"]: sub for sub in map(self._row_to_sub, rows)}
+        self._rebuild_indexes()
+        self._loaded = True
+        with self._lock:
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        return self.subscriptions
+
+    def _apply(self, record, index=True):
+        # The in-memory copy only exists once load() has been called
+        if self._loaded:
+            super()._apply(record, index)
+
+    def _commit(self, records):
+        # SQLite does its own locking, each commit is one transaction
+        self._check_records(records)
+        self._apply_all(records)
+        if records:
+            self._append(records)
+            if not self._loaded:
+                self.revision += 1
+
+    def poll_changes(self):
+        """Merge in commits made by other connections (see PRAGMA data_version)."""
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version or not self._loaded:
+            self._data_version = version
+            return []
+        self._data_version = version
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(SQLITE_COLUMNS)}, extra FROM subscriptions ORDER BY rowid").fetchall()
+        return self._merge([self._row_to_sub(row) for row in rows])
+
+    def iter_subscriptions(self):
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT {', '.join(SQLITE_COLUMNS)}, extra FROM subscriptions ORDER BY rowid")
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for row in rows:
+                yield self._row_to_sub(row)
+
+    def query(self, name=None, cycle=None, offset=0, limit=None):
+        where = []
+        params = []
+        if name:
+            escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append("name LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        if cycle:
+            where.append("cycle = ?")
+            params.append(cycle)
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM subscriptions{clause}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {', '.join(SQLITE_COLUMNS)}, extra FROM subscriptions{clause}"
+                " ORDER BY rowid LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, offset]).fetchall()
+        return total, [self._row_to_sub(row) for row in rows]
+
+    def get(self, sub_id):
+        if self._loaded:
+            return self.by_id.get(sub_id)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(SQLITE_COLUMNS)}, extra FROM subscriptions WHERE id = ?",
+                (sub_id,)).fetchone()
+        return self._row_to_sub(row) if row else None
+
+    def _upsert_sql(self):
+        columns = SQLITE_COLUMNS + ("extra",)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns[1:])
+        return (f"INSERT INTO subscriptions ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}")
+
+    def _append(self, records):
+        with self._lock, self._conn:
+            for record in records:
+                op = record["op"]
+                if op == "add":
+                    self._conn.execute(self._upsert_sql(), self._sub_to_row(record["sub"]))
+                elif op == "update":
+                    columns = {k: v for k, v in record["changes"].items() if k in SQLITE_COLUMNS}
+                    extra = {k: v for k, v in record["changes"].items() if k not in SQLITE_COLUMNS}
+                    assignments = [f"{column} = ?" for column in columns]
+                    params = list(columns.values())
+                    if extra:
+                        assignments.append("extra = json_patch(COALESCE(extra, '{}'), ?)")
+                        params.append(json.dumps(extra))
+                    if assignments:
+                        self._conn.execute(
+                            f"UPDATE subscriptions SET {', '.join(assignments)} WHERE id = ?",
+                            params + [record["id"]])
+                elif op == "delete":
+                    self._conn.execute("DELETE FROM subscriptions WHERE id = ?", (record["id"],))
+
+    def _cent_sums(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT COALESCE(json_extract(extra, '$.currency'), ?),"
+                " CASE cycle WHEN 'Monthly' THEN 'Monthly' ELSE 'Yearly' END,"
+                " SUM(CAST(ROUND(price * 100) AS INTEGER))"
+                " FROM subscriptions GROUP BY 1, 2", (DEFAULT_CURRENCY,)).fetchall()
+        return {(currency, cycle): cents for currency, cycle, cents in rows}
+
+    def totals(self):
+        sums = self._cent_sums()
+        return totals_from_cents(sum(c for (_, cycle), c in sums.items() if cycle == "Monthly"),
+                                 sum(c for (_, cycle), c in sums.items() if cycle == "Yearly"))
+
+    def breakdown(self):
+        return {key: Decimal(cents) / 100 for key, cents in self._cent_sums().items()}
+
+    def replace_all(self, subscriptions):
+        assign_subscription_ids(subscriptions)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM subscriptions")
+            self._conn.executemany(self._upsert_sql(),
+                                   (self._sub_to_row(sub) for sub in subscriptions))
+        self.by_id = {sub["id"]: Subscription(sub) for sub in subscriptions}
+        self._rebuild_indexes()
+
+    def compact(self):
+        with self._lock:
+            self._conn.execute("PRAGMA optimize")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_store(path=None):
+    """Pick the storage backend from the file extension.
+
+    Without a path, subscriptions.db next to the script wins over
+    subscriptions.json once it has been created with import_json_to_sqlite.
+    """
+    if path is None:
+        path = default_subscriptions_path()
+        db_path = os.path.splitext(path)[0] + ".db"
+        if os.path.exists(db_path):
+            path = db_path
+    if path.lower().endswith(SQLITE_SUFFIXES):
+        return SqliteSubscriptionStore(path)
+    return SubscriptionStore(path)
+
+
+def import_json_to_sqlite(json_path=None, db_path=None):
+    """One-shot conversion of a JSON ledger (and its icons) into SQLite."""
+    source = SubscriptionStore(json_path)
+    subscriptions = source.load()
+    source.close()
+    if db_path is None:
+        db_path = os.path.splitext(source.path)[0] + ".db"
+
+    target = SqliteSubscriptionStore(db_path)
+    for icon_id in {sub["icon_id"] for sub in subscriptions if sub.get("icon_id")}:
+        for size in (None,) + ICON_VARIANT_SIZES:
+            png = source.icon_store.read(icon_id, size)
+            if png is not None:
+                target.icon_store.write(icon_id, png, size)
+    target.replace_all(subscriptions)
+    target.close()
+    return len(subscriptions)
+
+
+class LRUCache:
+    """Small least-recently-used cache that builds missing values with loader.
+
+    With a name, hits and misses are counted in the diagnostics as
+    <name>.hit and <name>.miss.
+    """
+
+    def __init__(self, loader, max_size=256, name=None):
+        self._loader = loader
+        self.max_size = max_size
+        self.name = name
+        self._items = OrderedDict()
+
+    def get(self, key):
+        try:
+            self._items.move_to_end(key)
+            if self.name:
+                diag.count(self.name + ".hit")
+            return self._items[key]
+        except KeyError:
+            pass
+        if self.name:
+            diag.count(self.name + ".miss")
+        value = self._loader(key)
+        self._items[key] = value
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        return value
+
+    def resize(self, max_size):
+        self.max_size = max_size
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+FETCH_TIMEOUT = 5
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """Shared keep-alive session so repeated fetches reuse connections."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            import requests.adapters
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=32, pool_maxsize=32)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = "SUBmarine/1.0"
+            _http_session = session
+        return _http_session
+
+
+def fetch_website_info(url, session=None, raise_errors=False):
+    """Fetch website title and icon from a given URL.
+
+    Errors are printed and give (None, None), unless raise_errors is set.
+    """
+    if not url:
+        return None, None
+    if session is None:
+        session = get_http_session()
+
+    try:
+        # Ensure URL has proper scheme
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+
+        # Fetch website content
+        with diag.span("net.fetch_website"), \
+                session.get(url, timeout=FETCH_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+            return parse_website_info(url, response, session)
+
+    except Exception as e:
+        if raise_errors:
+            raise
+        print(f"Error fetching website info: {e}")
+        return None, None
+
+
+MAX_HEAD_BYTES = 256 * 1024
+ICON_RELS = {"icon", "apple-touch-icon", "apple-touch-icon-precomposed"}
+
+
+class HeadParser(HTMLParser):
+    """Picks the title and icon links out of a page's <head>.
+
+    Meant to be fed the page in chunks; done becomes True once the head is
+    over (or the title and the block of icon links have been seen) so the
+    rest of the page never has to be downloaded.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.icons = []
+        self.done = False
+        self._title_parts = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == "title" and self.title is None:
+            self._title_parts = []
+        elif tag == "link":
+            attrs = dict(attrs)
+            rels = set((attrs.get("rel") or "").lower().split())
+            if rels & ICON_RELS and attrs.get("href"):
+                self.icons.append({
+                    "href": attrs["href"],
+                    "sizes": attrs.get("sizes") or "",
+                    "type": attrs.get("type") or "",
+                })
+        elif tag == "body":
+            self.done = True
+        elif self.title and self.icons:
+            # Icon links come in one block, once something else follows
+            # there is nothing left we need
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._title_parts is not None:
+            self.title = "".join(self._title_parts).strip() or None
+            self._title_parts = None
+        elif tag == "head":
+            self.done = True
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+
+
+def icon_size(icon):
+    """Largest square size from a sizes="16x16 32x32" attribute, 0 if unknown."""
+    best = 0
+    for size in icon["sizes"].lower().split():
+        width, _, height = size.partition("x")
+        if width.isdigit() and height.isdigit():
+            best = max(best, min(int(width), int(height)))
+    return best
+
+
+def read_head(response, max_bytes=MAX_HEAD_BYTES):
+    """Stream a response into a HeadParser, stopping at the end of <head>."""
+    parser = HeadParser()
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    received = 0
+    for chunk in response.iter_content(chunk_size=8192):
+        received += len(chunk)
+        parser.feed(decoder.decode(chunk))
+        if parser.done or received >= max_bytes:
+            break
+    return parser
+
+
+def parse_website_info(url, response, session):
+    """Pull the title and icon bytes out of a streamed page response."""
+    head = read_head(response)
+    base_url = response.url or url
+
+    # Icon candidates, largest first, with /favicon.ico as the last resort
+    candidates = [icon for icon in head.icons if "svg" not in icon["type"].lower()
+                  and not icon["href"].lower().endswith(".svg")]
+    candidates.sort(key=icon_size, reverse=True)
+    icon_urls = [urljoin(base_url, icon["href"]) for icon in candidates]
+    icon_urls.append(urljoin(base_url, "/favicon.ico"))
+
+    icon_data = None
+    for icon_url in dict.fromkeys(icon_urls):
+        try:
+            icon_response = session.get(icon_url, timeout=FETCH_TIMEOUT)
+        except Exception:
+            continue
+        content_type = icon_response.headers.get("Content-Type", "")
+        if icon_response.status_code == 200 and icon_response.content \
+                and not content_type.startswith("text/"):
+            icon_data = icon_response.content
+            break
+
+    return head.title, icon_data
+
+
+def normalize_origin(url):
+    """scheme://host[:port] with default ports dropped, used as the cache key."""
+    if not url.lower().startswith(('http://', 'https://')):
+        url = 'https://' + url
+    parts = urlparse(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port is None or (scheme, port) in (("http", 80), ("https", 443)):
+        return f"{scheme}://{host}"
+    return f"{scheme}://{host}:{port}"
+
+
+def cache_expiry(headers, ttl, now):
+    """When a response stops being fresh, or None if it must not be stored.
+
+    Follows Cache-Control (no-store, no-cache, max-age) and Expires, falling
+    back to ttl when the server says nothing. Never longer than ttl.
+    """
+    directives = {}
+    for part in headers.get("Cache-Control", "").lower().split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name] = value.strip('"')
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return now
+    if "max-age" in directives:
+        try:
+            return now + min(max(int(directives["max-age"]), 0), ttl)
+        except ValueError:
+            pass
+    if headers.get("Expires"):
+        try:
+            from email.utils import parsedate_to_datetime
+            expires = parsedate_to_datetime(headers["Expires"]).timestamp()
+            return min(max(expires, now), now + ttl)
+        except (TypeError, ValueError):
+            return now
+    return now + ttl
+
+
+class MetadataCache:
+    """Persistent cache of fetched titles and icons keyed by site origin.
+
+    Fresh entries are served without touching the network. Stale ones are
+    revalidated with If-None-Match / If-Modified-Since, so an unchanged site
+    only costs a 304. Entries expire after ttl seconds at the latest and the
+    least recently used ones are evicted beyond max_entries.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=2000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries = OrderedDict()
+        try:
+            with open(path, "r") as f:
+                entries = json.load(f)
+            for key, entry in sorted(entries.items(), key=lambda kv: kv[1].get("accessed_at", 0)):
+                self._entries[key] = entry
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def lookup(self, url):
+        with self._lock:
+            return self._entries.get(normalize_origin(url))
+
+    def fetch(self, url, icon_store, session=None, revalidate=False, raise_errors=False):
+        """Return (title, icon_id) for url, going to the network only if needed.
+
+        revalidate=True skips the freshness check but still sends a
+        conditional request. With raise_errors, a failed fetch with no
+        cached copy to fall back on raises instead of giving (None, None).
+        """
+        if not url.startswith(('http://', 'https://')):
+            url = 'https://' + url
+        if session is None:
+            session = get_http_session()
+        key = normalize_origin(url)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry["accessed_at"] = now
+                self._dirty = True
+        if entry is not None and not revalidate and entry.get("expires", 0) > now:
+            diag.count("fetch_cache.fresh")
+            return entry.get("title"), entry.get("icon_id")
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            with diag.span("net.fetch_website"), \
+                    session.get(url, headers=headers, timeout=FETCH_TIMEOUT, stream=True) as response:
+                if response.status_code == 304 and entry is not None:
+                    diag.count("fetch_cache.not_modified")
+                    self._store(key, url, response, entry.get("title"), entry.get("icon_id"), now)
+                    return entry.get("title"), entry.get("icon_id")
+                response.raise_for_status()
+                diag.count("fetch_cache.miss")
+                title, icon_data = parse_website_info(url, response, session)
+        except Exception as e:
+            diag.count("net.fetch_errors")
+            if not raise_errors:
+                print(f"Error fetching website info: {e}")
+            # Serve the stale copy rather than nothing when offline
+            if entry is not None:
+                return entry.get("title"), entry.get("icon_id")
+            if raise_errors:
+                raise
+            return None, None
+
+        if title:
+            title = title.strip()
+        icon_id = icon_store.put(icon_data) if icon_data else None
+        if icon_id is None and entry is not None:
+            icon_id = entry.get("icon_id")
+        self._store(key, url, response, title, icon_id, now)
+        return title, icon_id
+
+    def _store(self, key, url, response, title, icon_id, now):
+        expires = cache_expiry(response.headers, self.ttl, now)
+        with self._lock:
+            if expires is None:
+                self._entries.pop(key, None)
+                self._dirty = True
+                return
+            entry = self._entries.get(key, {})
+            entry.update({
+                "url": url,
+                "title": title,
+                "icon_id": icon_id,
+                # A 304 may omit validators, keep the ones we already had
+                "etag": response.headers.get("ETag", entry.get("etag")),
+                "last_modified": response.headers.get("Last-Modified", entry.get("last_modified")),
+                "expires": expires,
+                "fetched_at": now,
+                "accessed_at": now,
+            })
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def icon_ids(self):
+        with self._lock:
+            return {e["icon_id"] for e in self._entries.values() if e.get("icon_id")}
+
+    def remap_icons(self, mapping):
+        """Point cached entries at new icon ids (old id -> new id)."""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.get("icon_id") in mapping:
+                    entry["icon_id"] = mapping[entry["icon_id"]]
+                    self._dirty = True
+
+    def flush(self):
+        """Write the cache to disk if anything changed since the last flush."""
+        with self._lock:
+            if not self._dirty:
+                return
+            # Drop entries that have not been fetched for a long time
+            cutoff = time.time() - 4 * self.ttl
+            for key in [k for k, e in self._entries.items() if e.get("fetched_at", 0) < cutoff]:
+                del self._entries[key]
+            data = json.dumps(dict(self._entries))
+            self._dirty = False
+        atomic_write(self.path, data)
+
+
+FETCH_RETRY_BASE = 30
+FETCH_RETRY_CAP = 6 * 3600
+FETCH_MAX_ATTEMPTS = 10
+
+
+def fetch_error_status(error):
+    """HTTP status of a failed fetch, or None if the server was never reached."""
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_permanent_fetch_error(error):
+    # Bad URLs and 4xx answers won't get better by retrying, except these two
+    status = fetch_error_status(error)
+    if status is not None:
+        return 400 <= status < 500 and status not in (408, 429)
+    return isinstance(error, ValueError)
+
+
+class FetchQueue:
+    """Website fetches still to be done, kept in a JSON file so they
+    survive restarts.
+
+    Jobs are keyed (by subscription id) and hold the url, the number of
+    failed attempts and when to try next. A failed job is retried after an
+    exponential backoff with jitter, and dropped after FETCH_MAX_ATTEMPTS
+    or a permanent error. Jobs that failed because the network was down
+    are retried straight away once any fetch succeeds again.
+    """
+
+    def __init__(self, path=None, rng=None):
+        self.path = path
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._jobs = {}
+        if path:
+            try:
+                with open(path, "r") as f:
+                    self._jobs = json.load(f)
+            except (FileNotFoundError, ValueError):
+                pass
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __contains__(self, key):
+        return key in self._jobs
+
+    def add(self, key, url, revalidate=False):
+        with self._lock:
+            self._jobs[key] = {"url": url, "revalidate": revalidate, "attempts": 0, "next_try": 0}
+            self._dirty = True
+
+    def jobs(self):
+        """Snapshot of (key, job) pairs, soonest first."""
+        with self._lock:
+            return sorted(((key, dict(job)) for key, job in self._jobs.items()),
+                          key=lambda item: item[1]["next_try"])
+
+    def done(self, key):
+        with self._lock:
+            if self._jobs.pop(key, None) is not None:
+                self._dirty = True
+
+    def backoff(self, attempts):
+        # "Equal jitter": half the exponential delay plus a random share of the rest
+        delay = min(FETCH_RETRY_CAP, FETCH_RETRY_BASE * 2 ** (attempts - 1))
+        return delay / 2 + self._rng.uniform(0, delay / 2)
+
+    def failed(self, key, error, now=None):
+        """Reschedule a failed job. Returns the delay, or None if it was dropped."""
+        now = time.time() if now is None else now
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                return None
+            self._dirty = True
+            job["attempts"] += 1
+            if is_permanent_fetch_error(error) or job["attempts"] >= FETCH_MAX_ATTEMPTS:
+                del self._jobs[key]
+                return None
+            delay = self.backoff(job["attempts"])
+            job["next_try"] = now + delay
+            job["offline"] = fetch_error_status(error) is None
+            job["error"] = str(error)[:200]
+            return delay
+
+    def defer(self, key, until):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job["next_try"] < until:
+                job["next_try"] = until
+                self._dirty = True
+
+    def wake_offline(self, now=None):
+        """Connectivity is back: make jobs that failed offline due now."""
+        now = time.time() if now is None else now
+        with self._lock:
+            for job in self._jobs.values():
+                if job.get("offline") and job["next_try"] > now:
+                    job["next_try"] = now
+                    job["offline"] = False
+                    self._dirty = True
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty or not self.path:
+                return
+            data = json.dumps(self._jobs)
+            self._dirty = False
+        atomic_write(self.path, data)
+
+
+class TokenBucket:
+    """Allows rate requests a second on average, in bursts of up to burst."""
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.time() if now is None else now
+
+    def take(self, now):
+        """Use up a token. Returns 0, or how many seconds until one is free."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class CircuitBreaker:
+    """Stops hammering a host that keeps failing.
+
+    After threshold failures in a row the circuit opens and nothing is sent
+    for cooldown seconds. Then one probe request is let through: success
+    closes the circuit, failure opens it again for twice as long (up to
+    max_cooldown).
+    """
+
+    def __init__(self, threshold=3, cooldown=60, max_cooldown=1800):
+        self.threshold = threshold
+        self.base_cooldown = self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self, now):
+        """0 if a request may go out now, otherwise seconds to wait."""
+        if self.opened_at is None:
+            return 0
+        if self.probing:
+            return self.cooldown
+        ready = self.opened_at + self.cooldown
+        if now < ready:
+            return ready - now
+        self.probing = True
+        return 0
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.cooldown = self.base_cooldown
+
+    def failure(self, now):
+        self.failures += 1
+        if self.probing:
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self.probing = False
+            self.opened_at = now
+        elif self.failures >= self.threshold and self.opened_at is None:
+            self.opened_at = now
+            diag.count("net.circuit_open")
+
+
+class WebsiteFetcher:
+    """Runs website fetches on a pool of worker threads.
+
+    Fetches go through a FetchQueue first, so they are retried with
+    backoff when they fail and picked up again after a restart. A
+    scheduler thread hands due jobs to the pool, holding them back while
+    their host's circuit breaker is open or its token bucket is empty.
+    At most per_host fetches run against the same host at once.
+
+    Results are put on a queue instead of being returned, so the Tk thread can
+    pick them up with drain() from an after() callback and never blocks on the
+    network. A failed attempt gives (key, None, None); a later retry that
+    works delivers the real result.
+    """
+
+    def __init__(self, icon_store, cache=None, max_workers=8, per_host=2,
+                 queue_path=None, rate=0.5, burst=3):
+        self.icon_store = icon_store
+        self.cache = cache
+        self.per_host = per_host
+        self.rate = rate
+        self.burst = burst
+        self.pending = FetchQueue(queue_path)
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="subber-fetch")
+        self._host_slots = {}
+        self._buckets = {}
+        self._breakers = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._stopped = False
+        self._results = queue.Queue()
+        self._scheduler = threading.Thread(target=self._schedule, name="subber-fetch-queue",
+                                           daemon=True)
+        self._scheduler.start()
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return slot
+
+    def _breaker(self, host):
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker()
+        return breaker
+
+    def submit(self, key, url, revalidate=False):
+        with self._wake:
+            self.pending.add(key, url, revalidate)
+            self._wake.notify()
+
+    def cancel(self, key):
+        """Forget a queued fetch, e.g. because its subscription was deleted."""
+        with self._wake:
+            self.pending.done(key)
+
+    def _schedule(self):
+        # Queue changes only happen under _wake and notify after them, so the
+        # deadline computed here can't miss one before wait() releases the lock
+        with self._wake:
+            while not self._stopped:
+                timeout = self._dispatch_due(time.time())
+                self.pending.flush()
+                self._wake.wait(timeout)
+
+    def _dispatch_due(self, now):
+        """Start every job that is due and allowed to run. Returns the
+        seconds until the next one could, or None if nothing is waiting."""
+        timeout = None
+        for key, job in self.pending.jobs():
+            if key in self._in_flight:
+                continue
+            wait = job["next_try"] - now
+            if wait <= 0:
+                host = urlparse(job["url"] if "://" in job["url"] else "https://" + job["url"]).netloc.lower()
+                wait = self._breaker(host).allow(now)
+                if wait > 0:
+                    self.pending.defer(key, now + wait)
+                else:
+                    bucket = self._buckets.get(host)
+                    if bucket is None:
+                        bucket = self._buckets[host] = TokenBucket(self.rate, self.burst, now)
+                    wait = bucket.take(now)
+                if wait <= 0:
+                    self._in_flight.add(key)
+                    self._executor.submit(self._run, key, job["url"], host, job["revalidate"])
+                    continue
+            timeout = wait if timeout is None else min(timeout, wait)
+        return timeout
+
+    def _run(self, key, url, host, revalidate):
+        icon_id = None
+        title = None
+        try:
+            with self._host_slot(url):
+                if self.cache is not None:
+                    title, icon_id = self.cache.fetch(url, self.icon_store, revalidate=revalidate,
+                                                      raise_errors=True)
+                else:
+                    title, icon_data = fetch_website_info(url, raise_errors=True)
+                    if icon_data:
+                        # Decode and resize here rather than on the Tk thread
+                        icon_id = self.icon_store.put(icon_data)
+                    if title:
+                        title = title.strip()
+        except Exception as e:
+            self._finished(key, host, e)
+        else:
+            self._finished(key, host)
+        finally:
+            self._results.put((key, title, icon_id))
+
+    def _finished(self, key, host, error=None):
+        now = time.time()
+        with self._wake:
+            self._in_flight.discard(key)
+            breaker = self._breaker(host)
+            if error is None or is_permanent_fetch_error(error):
+                # The host answered, so the network and the site are up
+                breaker.success()
+            else:
+                breaker.failure(now)
+            cancelled = key not in self.pending
+            if error is None:
+                self.pending.done(key)
+                self.pending.wake_offline(now)
+            elif not cancelled:
+                delay = self.pending.failed(key, error, now)
+            # Only now is the job's next try known to the scheduler
+            self._wake.notify()
+        if error is None or cancelled:
+            return
+        if delay is None:
+            print(f"Error fetching website info for {host}, giving up: {error}")
+        else:
+            diag.count("net.fetch_retries")
+            print(f"Error fetching website info for {host}, retrying in {delay:.0f}s: {error}")
+
+    def flush(self):
+        if self.cache is not None:
+            self.cache.flush()
+        self.pending.flush()
+
+    def drain(self):
+        """Return every result that has finished so far without blocking."""
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def shutdown(self):
+        with self._wake:
+            self._stopped = True
+            self._wake.notify()
+        # Jobs still queued or cancelled here stay in the queue file for next time
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.flush()
+
+
+def load_gui():
+    """Import the GUI toolkit and define the GUI classes on first use.
+
+    Returns the SubscriptionTracker class, or None when Tk or the GUI
+    packages are missing.
+    """
+    global HAS_TK, ctk, Image, messagebox, tkinter
+    global SubscriptionCard, SubscriptionList, ThemeManager, SubscriptionTracker
+    if "SubscriptionTracker" in globals():
+        return globals()["SubscriptionTracker"]
+    if HAS_TK is False:
+        return None
+
+    # Ensure the system tkinter (TK) library is available. customtkinter depends on
+    # the stdlib tkinter which is often provided by a separate system package
+    # (for example `python3-tk` on Debian/Ubuntu). If it's missing, we fall back to
+    # a basic CLI so the script doesn't crash and basic subscription management
+    # still works.
+    try:
+        import tkinter
+    except Exception:
+        HAS_TK = False
+        print("Warning: the 'tkinter' module is not available in this Python environment.")
+        print("customtkinter (the GUI) won't be available. Falling back to CLI mode.")
+        print("To enable the GUI, install your system's Tk package (e.g. python3-tk).")
+        return None
+
     try:
         import customtkinter as ctk
         from PIL import Image
@@ -41,12 +2905,296 @@ if HAS_TK:
         print("Warning: required GUI Python packages are not available in the environment.")
         print("Falling back to CLI mode. You can install packages with:")
         print("  python -m pip install --user customtkinter CTkMessagebox Pillow")
+        return None
+    HAS_TK = True
+
+    class SubscriptionCard(ctk.CTkFrame):
+        """A single subscription card. Cards are pooled by SubscriptionList and
+        rebound to whichever subscription is scrolled into their slot."""
+
+        def __init__(self, master, app, height):
+            super().__init__(master, height=height)
+            self.pack_propagate(False)
+            self.app = app
+            self.sub_id = None
+            self._shown = None
+
+            # Header frame for icon and name
+            header_frame = ctk.CTkFrame(self, fg_color="transparent")
+            header_frame.pack(fill="x", pady=5)
+
+            self.icon_label = ctk.CTkLabel(header_frame, text="")
+            self.name_label = ctk.CTkLabel(header_frame, text="",
+                                           font=app.font(16, "bold"))
+            self.name_label.pack(side="left", pady=5)
+            self.title_label = ctk.CTkLabel(header_frame, text="", text_color="gray")
+            self.title_label.pack(side="left", padx=10, pady=5)
+
+            self.price_label = ctk.CTkLabel(self, text="")
+            self.price_label.pack()
+
+            self.added_label = ctk.CTkLabel(self, text="")
+            self.added_label.pack(pady=5)
+
+            button_frame = ctk.CTkFrame(self, fg_color="transparent")
+            button_frame.pack(pady=5)
+
+            self.visit_button = app.theme.register(
+                ctk.CTkButton(button_frame, text="Visit Website",
+                              command=lambda: app.open_subscription_website(self.sub_id)))
+            self.delete_button = ctk.CTkButton(button_frame, text="Delete",
+                                               command=lambda: app.confirm_delete_subscription(self.sub_id),
+                                               fg_color="red")
+            self.delete_button.pack(side="right", padx=5)
+            self.edit_button = app.theme.register(
+                ctk.CTkButton(button_frame, text="Edit",
+                              command=lambda: app.show_edit_dialog(self.sub_id)))
+            self.edit_button.pack(side="right", padx=5)
+
+        def show(self, sub):
+            # Only touch the widgets when what the card displays has changed,
+            # scrolling rebinds cards constantly.
+            pending = self.app.is_fetch_pending(sub["id"])
+            shown = (sub["id"], sub["name"], sub["price"], sub["cycle"],
+                     sub.get("website"), sub.get("date_added"), sub.get("icon_id"),
+                     sub.get("title"), pending)
+            if shown == self._shown:
+                return
+            previous = self._shown
+            self._shown = shown
+            self.sub_id = sub["id"]
+
+            if previous is None or previous[6] != shown[6] or previous[8] != pending:
+                if sub.get("icon_id"):
+                    icon_photo = self.app.load_icon(sub["icon_id"])
+                elif pending:
+                    icon_photo = self.app.placeholder_icon()
+                else:
+                    icon_photo = None
+                if icon_photo is not None:
+                    self.icon_label.configure(image=icon_photo)
+                    self.icon_label.pack(side="left", padx=5, before=self.name_label)
+                else:
+                    self.icon_label.pack_forget()
+
+            self.name_label.configure(text=sub["name"])
+            if pending:
+                self.title_label.configure(text="Fetching website info...")
+            else:
+                self.title_label.configure(text=sub.get("title") or "")
+
+            currency = sub.get("currency")
+            price_text = f"{format_money(sub['price'], currency)} {sub['cycle']}"
+            yearly_cost = sub['price'] * (1 if sub['cycle'] == 'Yearly' else 12)
+            monthly_cost = sub['price'] * (1/12 if sub['cycle'] == 'Yearly' else 1)
+            price_text += (f" ({format_money(monthly_cost, currency)}/mo,"
+                           f" {format_money(yearly_cost, currency)}/yr)")
+            self.price_label.configure(text=price_text)
+
+            self.added_label.configure(text=f"Added: {sub.get('date_added', '?')}")
+
+            if sub.get("website"):
+                self.visit_button.pack(side="left", padx=5, before=self.edit_button)
+            else:
+                self.visit_button.pack_forget()
+
+        def invalidate(self):
+            self._shown = None
+
+    class SubscriptionList(ctk.CTkFrame):
+        """Virtualized list of subscription cards.
+
+        Only the cards needed to fill the visible area are created. Scrolling
+        moves and rebinds those pooled cards instead of building one card per
+        subscription, and add/delete/edit only patch the affected rows.
+        """
+
+        ROW_HEIGHT = 160
+        CARD_GAP = 10
+
+        def __init__(self, master, app, **kwargs):
+            super().__init__(master, **kwargs)
+            self.app = app
+            self._lookup = app.subscriptions_by_id.get
+            self._ids = []
+            self._offset = 0
+            self._pool = []
+            self._bound = {}  # subscription id -> card currently showing it
+
+            self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+            self.scrollbar.pack(side="right", fill="y")
+            self.body = ctk.CTkFrame(self, fg_color="transparent")
+            self.body.pack(side="left", fill="both", expand=True)
+            self.body.bind("<Configure>", lambda e: self._render())
+
+            if sys.platform.startswith("linux"):
+                self.bind_all("<Button-4>", self._on_mousewheel, add=True)
+                self.bind_all("<Button-5>", self._on_mousewheel, add=True)
+            else:
+                self.bind_all("<MouseWheel>", self._on_mousewheel, add=True)
+
+        def set_items(self, ids):
+            self._ids = list(ids)
+            self._render()
+
+        def insert(self, sub_id, index=None):
+            if index is None:
+                self._ids.append(sub_id)
+            else:
+                self._ids.insert(index, sub_id)
+            self._render()
+
+        def remove(self, sub_id):
+            try:
+                self._ids.remove(sub_id)
+            except ValueError:
+                return
+            self._render()
+
+        def items(self):
+            return list(self._ids)
+
+        def trim_pool(self):
+            # Cards that aren't on screen would only be re-laid out for nothing
+            visible = set(self._bound.values())
+            for card in self._pool:
+                if card not in visible:
+                    card.destroy()
+            self._pool = [card for card in self._pool if card in visible]
+
+        def rescale(self):
+            """Redraw the visible cards after a scaling change, with icons for the new size."""
+            for card in self._pool:
+                card.invalidate()
+            self._render()
+
+        def update_item(self, sub_id):
+            # Only re-render if the edited subscription is on screen
+            card = self._bound.get(sub_id)
+            sub = self._lookup(sub_id)
+            if card is not None and sub is not None:
+                card.invalidate()
+                card.show(sub)
 
-    # If HAS_TK remains True, the GUI class will be defined below.
+        def _viewport_height(self):
+            return self._reverse_widget_scaling(self.body.winfo_height())
+
+        def _max_offset(self):
+            return max(0, len(self._ids) * self.ROW_HEIGHT - self._viewport_height())
+
+        def _ensure_pool(self, count):
+            while len(self._pool) < count:
+                with diag.span("ui.card_build"):
+                    card = SubscriptionCard(self.body, self.app, self.ROW_HEIGHT - self.CARD_GAP)
+                self._pool.append(card)
+
+        def _render(self):
+            with diag.span("ui.render"):
+                self._render_rows()
+
+        def _render_rows(self):
+            viewport = self._viewport_height()
+            self._offset = min(max(self._offset, 0), self._max_offset())
+
+            visible = math.ceil(viewport / self.ROW_HEIGHT) + 1
+            self._ensure_pool(visible)
+
+            first = int(self._offset // self.ROW_HEIGHT)
+            shift = -(self._offset % self.ROW_HEIGHT)
+            self._bound = {}
+            for slot, card in enumerate(self._pool):
+                index = first + slot
+                sub = self._lookup(self._ids[index]) if slot < visible and index < len(self._ids) else None
+                if sub is None:
+                    card.place_forget()
+                    continue
+                card.show(sub)
+                card.place(x=0, y=slot * self.ROW_HEIGHT + shift + self.CARD_GAP / 2, relwidth=1.0)
+                self._bound[sub["id"]] = card
+
+            total = len(self._ids) * self.ROW_HEIGHT
+            if total <= viewport or total == 0:
+                self.scrollbar.set(0.0, 1.0)
+            else:
+                self.scrollbar.set(self._offset / total, (self._offset + viewport) / total)
+
+        def _scroll_to(self, offset):
+            self._offset = offset
+            self._render()
+
+        def _on_scrollbar(self, action, value, unit=None):
+            total = len(self._ids) * self.ROW_HEIGHT
+            if action == "moveto":
+                self._scroll_to(float(value) * total)
+            elif action == "scroll":
+                step = self.ROW_HEIGHT if unit == "units" else self._viewport_height()
+                self._scroll_to(self._offset + int(value) * step)
+
+        def _on_mousewheel(self, event):
+            # bind_all sees every wheel event, only react inside the list
+            if not str(event.widget).startswith(str(self)):
+                return
+            if event.num == 4:
+                delta = -1
+            elif event.num == 5:
+                delta = 1
+            else:
+                delta = -1 if event.delta > 0 else 1
+            self._scroll_to(self._offset + delta * self.ROW_HEIGHT / 2)
+
+    class ThemeManager:
+        """Applies the hue to registered widgets instead of walking the tree.
+
+        Widgets are held weakly per role, so pooled cards and closed dialogs
+        don't have to unregister. set_hue() is throttled to one update per
+        frame and a widget is only reconfigured when its colors change.
+        Delete buttons are never registered and keep their red.
+        """
+
+        FRAME_MS = 16
+
+        def __init__(self, root, hue):
+            self.root = root
+            self.hue = hue
+            self._roles = {"button": weakref.WeakSet(), "slider": weakref.WeakSet()}
+            self._applied = weakref.WeakKeyDictionary()
+            self._pending = None
+
+        def colors(self, role):
+            if role == "slider":
+                return {"progress_color": hue_to_color(self.hue)}
+            return {"fg_color": hue_to_color(self.hue),
+                    "hover_color": hue_to_color(self.hue, s=0.7, v=0.8)}
+
+        def register(self, widget, role="button"):
+            self._roles[role].add(widget)
+            self._apply_to(widget, self.colors(role))
+            return widget
+
+        def set_hue(self, hue):
+            self.hue = hue
+            if self._pending is None:
+                self._pending = self.root.after(self.FRAME_MS, self._apply_all)
+
+        def _apply_to(self, widget, colors):
+            if self._applied.get(widget) == colors:
+                return
+            try:
+                widget.configure(**colors)
+            except tkinter.TclError:
+                # Widget was destroyed but not yet garbage collected
+                return
+            self._applied[widget] = colors
+
+        def _apply_all(self):
+            self._pending = None
+            for role, widgets in self._roles.items():
+                colors = self.colors(role)
+                for widget in list(widgets):
+                    self._apply_to(widget, colors)
 
-if HAS_TK:
     class SubscriptionTracker(ctk.CTk):
-        def __init__(self):
+        def __init__(self, subs_path=None):
             # Load settings first
             self.settings = self.load_settings()
             
@@ -56,15 +3204,65 @@ if HAS_TK:
             
             # Initialize window
             super().__init__()
+            self.settings.use_scheduler(self.after, self.after_cancel)
+            if self.settings.get("diagnostics_enabled"):
+                diag.enable()
             self.title("SUBmarine")
             self.geometry("800x600")
             
+            # One CTkFont per size/weight, shared by every widget using it
+            self.fonts = {}
+            self.main_frame = None
+
             # Apply scaling
             self.apply_scaling(self.settings.get("scaling_factor", 1.0))
             
             # Initialize data storage
-            self.subscriptions = []
+            if self.settings.get("server_url"):
+                self.store = RemoteStore(self.settings["server_url"])
+                self.subs_path = subs_path or default_subscriptions_path()
+            else:
+                self.store = open_store(subs_path)
+                self.subs_path = self.store.path
+            # Favicons are decoded and resized in worker processes
+            self.icon_pipeline = IconPipeline()
+            self.icon_store = self.store.icon_store
+            self.icon_store.pipeline = self.icon_pipeline
+            self.icon_cache = LRUCache(self.build_icon_image,
+                                       self.settings.get("icon_cache_size", 256), name="icon_cache")
             self.load_subscriptions()
+            self.rates = rates_for(self.subs_path)
+            self.currency_totals = CurrencyTotals(self.store, self.rates)
+            self.projections = ProjectionEngine(self.store, self.rates)
+
+            self.theme = ThemeManager(self, self.settings.get("hue", 200))
+
+            # Website info is fetched in the background, results come back
+            # through the fetcher's queue which we poll from the Tk loop
+            self.metadata_cache = MetadataCache(
+                os.path.join(os.path.dirname(self.subs_path), "fetch_cache.json"))
+            # Fetches that fail are retried later, even after a restart
+            self.fetcher = WebsiteFetcher(
+                self.icon_store, self.metadata_cache,
+                queue_path=os.path.join(os.path.dirname(self.subs_path), "fetch_queue.json"))
+            self.pending_fetches = set()
+            self._placeholder_icon = None
+
+            # Renewal notifications are found on a background thread and
+            # shown from the Tk loop
+            self.due_notifications = queue.Queue()
+            self.notified_renewals = set(self.settings.get("notified_renewals", []))
+            self.renewal_scheduler = None
+            self.restart_renewal_scheduler()
+            # A remote ledger is fetched on a thread, the Tk loop only merges
+            self.remote_changes = queue.Queue()
+            self.closing = threading.Event()
+            if isinstance(self.store, RemoteStore):
+                threading.Thread(target=self.watch_remote_store, name="subber-remote",
+                                 daemon=True).start()
+            self.after(100, self.poll_fetch_results)
+            self.after(1000, self.poll_external_changes)
+            self.protocol("WM_DELETE_WINDOW", self.on_close)
             
             # Create main layout
             self.create_widgets()
@@ -76,42 +3274,91 @@ if HAS_TK:
             
             # Logo/Title
             self.logo_label = ctk.CTkLabel(self.sidebar, text="SUBmarine", 
-                                          font=ctk.CTkFont(size=24, weight="bold"))
+                                          font=self.font(24, "bold"))
             self.logo_label.pack(pady=20)
             
             # Add subscription button
-            self.add_button = ctk.CTkButton(self.sidebar, text="Add Subscription",
-                                           command=self.show_add_dialog)
+            self.add_button = self.theme.register(
+                ctk.CTkButton(self.sidebar, text="Add Subscription",
+                              command=self.show_add_dialog))
             self.add_button.pack(pady=10, padx=20)
+
+            # Paste many rows at once, e.g. copied from a spreadsheet
+            self.batch_button = self.theme.register(
+                ctk.CTkButton(self.sidebar, text="Batch Add/Edit",
+                              command=self.show_batch_dialog))
+            self.batch_button.pack(pady=10, padx=20)
             
             # Settings button
-            self.settings_button = ctk.CTkButton(self.sidebar, text="Settings",
-                                               command=self.show_settings_dialog)
+            self.settings_button = self.theme.register(
+                ctk.CTkButton(self.sidebar, text="Settings",
+                              command=self.show_settings_dialog))
             self.settings_button.pack(pady=10, padx=20)
+
+            # Refetch titles and icons for every subscription with a website
+            self.refresh_icons_button = self.theme.register(
+                ctk.CTkButton(self.sidebar, text="Refresh All Icons",
+                              command=self.refresh_all_icons))
+            self.refresh_icons_button.pack(pady=10, padx=20)
+
+            self.history_button = self.theme.register(
+                ctk.CTkButton(self.sidebar, text="Spending History",
+                              command=self.show_spending_dialog))
+            self.history_button.pack(pady=10, padx=20)
             
             # Stats Frame
             self.stats_frame = ctk.CTkFrame(self.sidebar)
             self.stats_frame.pack(pady=20, padx=20, fill="x")
             
-            self.monthly_total = ctk.CTkLabel(self.stats_frame, text="Monthly Total: $0.00")
+            self.monthly_total = ctk.CTkLabel(self.stats_frame, text="Monthly Total: $0.00",
+                                              justify="left")
             self.monthly_total.pack(pady=5)
             
-            self.yearly_total = ctk.CTkLabel(self.stats_frame, text="Yearly Total: $0.00")
+            self.yearly_total = ctk.CTkLabel(self.stats_frame, text="Yearly Total: $0.00",
+                                             justify="left")
             self.yearly_total.pack(pady=5)
+
+            self.due_soon = ctk.CTkLabel(self.stats_frame, text="", justify="left")
+            self.due_soon.pack(pady=5)
             
             # Main content area
-            self.main_frame = ctk.CTkScrollableFrame(self)
-            self.main_frame.pack(side="right", fill="both", expand=True, padx=20, pady=20)
+            self.content_frame = ctk.CTkFrame(self, fg_color="transparent")
+            self.content_frame.pack(side="right", fill="both", expand=True, padx=20, pady=20)
+
+            # Search and sort bar
+            search_bar = ctk.CTkFrame(self.content_frame, fg_color="transparent")
+            search_bar.pack(fill="x", pady=(0, 10))
+
+            self.search_var = ctk.StringVar()
+            self.search_entry = ctk.CTkEntry(search_bar, textvariable=self.search_var,
+                                             placeholder_text="Search subscriptions...")
+            self.search_entry.pack(side="left", fill="x", expand=True)
+            self.search_entry.bind("<KeyRelease>", lambda e: self.schedule_filter())
+            self._filter_job = None
+
+            self.sort_var = ctk.StringVar(value="Added order")
+            ctk.CTkOptionMenu(search_bar, variable=self.sort_var,
+                              values=list(SORT_OPTIONS),
+                              command=lambda choice: self.apply_filter()).pack(side="left", padx=(10, 0))
+
+            self.main_frame = SubscriptionList(self.content_frame, self)
+            self.main_frame.pack(fill="both", expand=True)
             
             self.refresh_subscription_list()
             
-            # Apply initial colors if they exist
-            self.apply_color_theme(self.settings.get("hue", 200))
-            
         def show_add_dialog(self):
+            self.show_subscription_dialog()
+
+        def show_edit_dialog(self, sub_id):
+            sub = self.subscriptions_by_id.get(sub_id)
+            if sub is not None:
+                self.show_subscription_dialog(sub)
+
+        def show_subscription_dialog(self, sub=None):
+            # Adds a subscription, or edits sub in place
             dialog = ctk.CTkToplevel(self)
-            dialog.title("Add Subscription")
-            dialog.geometry("400x400")
+            dialog.title("Edit Subscription" if sub else "Add Subscription")
+            dialog.geometry("400x470")
             dialog.resizable(False, False)
             dialog.transient(self)  # Make dialog modal
             
@@ -133,14 +3380,26 @@ if HAS_TK:
             price_entry.pack(fill="x")
             
             ctk.CTkLabel(main_frame, text="Billing Cycle:").pack(pady=(15, 5))
-            cycle_var = ctk.StringVar(value="Monthly")
+            cycle_var = ctk.StringVar(value=sub["cycle"] if sub else "Monthly")
             cycle_menu = ctk.CTkOptionMenu(main_frame, values=["Monthly", "Yearly"],
                                          variable=cycle_var)
             cycle_menu.pack(fill="x")
+
+            ctk.CTkLabel(main_frame, text="Currency:").pack(pady=(15, 5))
+            # A subscription without a currency is in DEFAULT_CURRENCY, not the display one
+            currency_var = ctk.StringVar(value=(sub.get("currency") or DEFAULT_CURRENCY) if sub
+                                         else self.settings.get("display_currency", DEFAULT_CURRENCY))
+            currencies = sorted(set(self.rates.currencies()) | {currency_var.get()})
+            ctk.CTkOptionMenu(main_frame, values=currencies, variable=currency_var).pack(fill="x")
             
             ctk.CTkLabel(main_frame, text="Website URL:").pack(pady=(15, 5))
             website_entry = ctk.CTkEntry(main_frame)
             website_entry.pack(fill="x")
+
+            if sub:
+                name_entry.insert(0, sub["name"])
+                price_entry.insert(0, str(sub["price"]))
+                website_entry.insert(0, sub.get("website") or "")
             
             # Dynamic tracking option
             dynamic_var = ctk.BooleanVar(value=True)
@@ -166,27 +3425,37 @@ if HAS_TK:
                 if website and not website.startswith(('http://', 'https://')):
                     website = 'https://' + website
                     
-                # Dynamic tracking
-                icon_data = None
-                if dynamic_var.get() and website:
-                    dialog.configure(cursor="wait")
-                    title, icon_data = self.fetch_website_info(website)
-                    dialog.configure(cursor="")
-                
-                sub = {
+                fields = {
                     "name": name,
                     "price": price,
                     "cycle": cycle_var.get(),
                     "website": website,
-                    "date_added": datetime.now().strftime("%Y-%m-%d")
+                    "currency": currency_var.get()
                 }
-                
-                if icon_data:
-                    sub["icon"] = icon_data.hex()  # Store binary data as hex string
-                    
-                self.subscriptions.append(sub)
-                self.save_subscriptions()
-                self.refresh_subscription_list()
+                if sub:
+                    current = {**sub, "website": sub.get("website") or "",
+                               "currency": sub.get("currency") or DEFAULT_CURRENCY}
+                    changes = {key: value for key, value in fields.items() if current.get(key) != value}
+                    # A price equal to the stored float to the cent (9.99 vs 9.990) isn't a change
+                    if "price" in changes and to_cents(price) == to_cents(sub["price"]):
+                        del changes["price"]
+                    sub_id = sub["id"]
+                    refetch = "website" in changes
+                else:
+                    fields["id"] = sub_id = new_subscription_id()
+                    fields["date_added"] = datetime.now().strftime("%Y-%m-%d")
+                    refetch = True
+
+                # Dynamic tracking happens in the background, the card shows a
+                # placeholder until the fetch comes back
+                if dynamic_var.get() and website and refetch:
+                    self.pending_fetches.add(sub_id)
+                    self.fetcher.submit(sub_id, website)
+
+                if not sub:
+                    self.add_subscription(fields)
+                elif changes:
+                    self.update_subscription(sub_id, **changes)
                 dialog.destroy()
             
             # Fixed-height footer frame to ensure consistent button layout
@@ -202,7 +3471,7 @@ if HAS_TK:
             button_frame.grid_columnconfigure(0, weight=1)
             button_frame.grid_columnconfigure(1, weight=1)
 
-            btn_font = ctk.CTkFont(size=14, weight="bold")
+            btn_font = self.font(14, "bold")
             cancel_btn = ctk.CTkButton(
                 button_frame,
                 text="Cancel",
@@ -219,9 +3488,10 @@ if HAS_TK:
                 width=120,
                 height=40,
                 corner_radius=8,
-                font=btn_font,
-                fg_color=self.get_color(self.settings.get("hue", 200))
+                font=btn_font
             )
+            self.theme.register(cancel_btn)
+            self.theme.register(save_btn)
 
             # Place buttons in the grid
             cancel_btn.grid(row=0, column=0, sticky="ew", padx=8)
@@ -233,7 +3503,95 @@ if HAS_TK:
             # Bind Enter key to save
             dialog.bind("<Return>", lambda e: save())
             dialog.bind("<Escape>", lambda e: dialog.destroy())
-            
+            
+        def show_batch_dialog(self):
+            dialog = ctk.CTkToplevel(self)
+            dialog.title("Batch Add/Edit")
+            dialog.geometry("700x520")
+            dialog.transient(self)
+            self.wait_visibility(dialog)
+            dialog.grab_set()
+
+            main_frame = ctk.CTkFrame(dialog, fg_color="transparent")
+            main_frame.pack(fill="both", expand=True, padx=20, pady=20)
+
+            ctk.CTkLabel(main_frame, justify="left", anchor="w",
+                         text="Paste rows from a spreadsheet or type CSV, one subscription per line:\n"
+                              "name, price, cycle, website, currency - or a header row naming the columns.\n"
+                              "Rows with the id of an existing subscription edit it.").pack(fill="x")
+            textbox = ctk.CTkTextbox(main_frame, wrap="none")
+            textbox.pack(fill="both", expand=True, pady=10)
+            status_label = ctk.CTkLabel(main_frame, text="", anchor="w", justify="left")
+            status_label.pack(fill="x")
+            dynamic_var = ctk.BooleanVar(value=True)
+            ctk.CTkCheckBox(main_frame, text="Dynamic Tracking for new rows with a website",
+                            variable=dynamic_var).pack(anchor="w", pady=(5, 0))
+
+            preview_job = None
+
+            def parse():
+                return batch_records(parse_pasted_rows(textbox.get("1.0", "end")),
+                                     self.subscriptions_by_id)
+
+            def preview():
+                nonlocal preview_job
+                preview_job = None
+                records, errors = parse()
+                adds = sum(record["op"] == "add" for record in records)
+                text = f"{adds} to add, {len(records) - adds} to update"
+                if errors:
+                    text += f", {len(errors)} invalid (row {errors[0][0]}: {errors[0][1]})"
+                status_label.configure(text=text)
+
+            def schedule_preview(event=None):
+                nonlocal preview_job
+                if preview_job is not None:
+                    dialog.after_cancel(preview_job)
+                preview_job = dialog.after(200, preview)
+
+            def fill_with_list():
+                # The rows currently listed, with ids so they can be edited here
+                columns = ("id",) + PASTE_COLUMNS
+                lines = ["\t".join(columns)]
+                for sub_id in self.main_frame.items():
+                    sub = self.subscriptions_by_id.get(sub_id)
+                    if sub is not None:
+                        lines.append("\t".join(str(sub.get(key) or "") for key in columns))
+                textbox.delete("1.0", "end")
+                textbox.insert("1.0", "\n".join(lines) + "\n")
+                preview()
+
+            def apply():
+                records, errors = parse()
+                if errors and not messagebox.askyesno(
+                        "Batch Add/Edit", f"{len(errors)} rows are invalid and will be skipped. Continue?",
+                        parent=dialog):
+                    return
+                self.apply_records(records)
+                if dynamic_var.get():
+                    for record in records:
+                        sub = record.get("sub")
+                        if sub and sub.get("website") and not sub.get("icon_id"):
+                            self.pending_fetches.add(sub["id"])
+                            self.fetcher.submit(sub["id"], sub["website"])
+                            self.main_frame.update_item(sub["id"])
+                dialog.destroy()
+
+            textbox.bind("<KeyRelease>", schedule_preview)
+            textbox.bind("<<Paste>>", lambda e: dialog.after_idle(preview))
+
+            button_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+            button_frame.pack(fill="x", pady=(10, 0))
+            for column in range(3):
+                button_frame.grid_columnconfigure(column, weight=1)
+            buttons = (("Cancel", dialog.destroy), ("Fill With List", fill_with_list), ("Apply", apply))
+            for column, (text, command) in enumerate(buttons):
+                button = self.theme.register(ctk.CTkButton(button_frame, text=text, command=command, height=36))
+                button.grid(row=0, column=column, sticky="ew", padx=8)
+
+            textbox.focus_set()
+            dialog.bind("<Escape>", lambda e: dialog.destroy())
+
         def show_settings_dialog(self):
             dialog = ctk.CTkToplevel(self)
             dialog.title("Settings")
@@ -261,7 +3619,7 @@ if HAS_TK:
             scaling_frame.pack(fill="x", pady=(10, 20))
 
             ctk.CTkLabel(scaling_frame, text="Display Scaling",
-                        font=ctk.CTkFont(size=16, weight="bold")).pack(pady=10)
+                        font=self.font(16, "bold")).pack(pady=10)
 
             # Create more granular scaling options from 75% to 300% in quarter steps
             scale_values = []
@@ -289,7 +3647,7 @@ if HAS_TK:
             appearance_frame.pack(fill="x", pady=(0, 20))
 
             ctk.CTkLabel(appearance_frame, text="Appearance",
-                        font=ctk.CTkFont(size=16, weight="bold")).pack(pady=10)
+                        font=self.font(16, "bold")).pack(pady=10)
 
             # Mode selection (Light/Dark)
             ctk.CTkLabel(appearance_frame, text="Theme Mode:").pack(pady=(5, 0))
@@ -309,9 +3667,19 @@ if HAS_TK:
             mode_menu.set(self.appearance_mode.capitalize())
             mode_menu.pack(pady=5)
 
+            # Totals currency
+            ctk.CTkLabel(appearance_frame, text="Show Totals In:").pack(pady=(5, 0))
+            currency_menu = ctk.CTkOptionMenu(
+                appearance_frame,
+                values=self.rates.currencies(),
+                command=self.set_display_currency
+            )
+            currency_menu.set(self.settings.get("display_currency", DEFAULT_CURRENCY))
+            currency_menu.pack(pady=5)
+
             # Color customization with rainbow slider
             ctk.CTkLabel(appearance_frame, text="Color Theme:",
-                        font=ctk.CTkFont(weight="bold")).pack(pady=(15, 5))
+                        font=self.font(weight="bold")).pack(pady=(15, 5))
 
             # Create a frame for the color preview
             preview_frame = ctk.CTkFrame(appearance_frame, height=30)
@@ -323,9 +3691,9 @@ if HAS_TK:
                 from_=0,
                 to=360,
                 number_of_steps=360,
-                command=self.apply_color_theme,
-                progress_color=self.get_color(self.settings.get("hue", 200))
+                command=self.apply_color_theme
             )
+            self.theme.register(hue_slider, role="slider")
             hue_slider.pack(fill="x", pady=5, padx=20)
 
             # Set initial hue value
@@ -339,7 +3707,7 @@ if HAS_TK:
             enabled_frame.pack(fill="x", pady=(10, 20))
 
             ctk.CTkLabel(enabled_frame, text="Notifications Enabled",
-                        font=ctk.CTkFont(size=16, weight="bold")).pack(pady=10)
+                        font=self.font(16, "bold")).pack(pady=10)
 
             enabled_switch = ctk.CTkSwitch(
                 enabled_frame,
@@ -354,7 +3722,7 @@ if HAS_TK:
             when_frame.pack(fill="x", pady=(0, 20))
 
             ctk.CTkLabel(when_frame, text="When to Notify",
-                        font=ctk.CTkFont(size=16, weight="bold")).pack(pady=10)
+                        font=self.font(16, "bold")).pack(pady=10)
 
             when_options = ["1 day", "3 days", "1 week", "2 weeks"]
             when_menu = ctk.CTkOptionMenu(
@@ -370,7 +3738,7 @@ if HAS_TK:
             push_frame.pack(fill="x", pady=(0, 20))
 
             ctk.CTkLabel(push_frame, text="Push Notifications",
-                        font=ctk.CTkFont(size=16, weight="bold")).pack(pady=10)
+                        font=self.font(16, "bold")).pack(pady=10)
 
             push_switch = ctk.CTkSwitch(
                 push_frame,
@@ -385,7 +3753,7 @@ if HAS_TK:
             text_frame.pack(fill="x", pady=(0, 20))
 
             ctk.CTkLabel(text_frame, text="Custom Notification Text",
-                        font=ctk.CTkFont(size=16, weight="bold")).pack(pady=10)
+                        font=self.font(16, "bold")).pack(pady=10)
 
             custom_text_entry = ctk.CTkEntry(text_frame)
             custom_text_entry.pack(fill="x", pady=5)
@@ -397,33 +3765,157 @@ if HAS_TK:
 
             custom_text_entry.bind("<KeyRelease>", lambda e: save_custom_text())
 
+            # Diagnostics Tab
+            diagnostics_tab = tabview.add("Diagnostics")
+
+            diag_switch = ctk.CTkSwitch(
+                diagnostics_tab,
+                text="Record timings",
+                command=lambda: self.toggle_diagnostics(diag_switch)
+            )
+            diag_switch.pack(pady=(10, 5))
+            diag_switch.select() if diag.enabled else diag_switch.deselect()
+
+            report_box = ctk.CTkTextbox(diagnostics_tab, font=self.font(12, family="Courier"),
+                                        wrap="none")
+            report_box.pack(fill="both", expand=True, pady=5)
+
+            def refresh_report():
+                if not report_box.winfo_exists():
+                    return
+                report_box.configure(state="normal")
+                report_box.delete("1.0", "end")
+                report_box.insert("1.0", diag.report() if diag.enabled
+                                  else "Turn on \"Record timings\" to see where the time goes.")
+                report_box.configure(state="disabled")
+                dialog.after(1000, refresh_report)
+
+            def reset_report():
+                diag.reset()
+                report_box.configure(state="normal")
+                report_box.delete("1.0", "end")
+                report_box.configure(state="disabled")
+
+            self.theme.register(ctk.CTkButton(diagnostics_tab, text="Reset",
+                                              command=reset_report)).pack(pady=5)
+            refresh_report()
+
             # Close button
-            ctk.CTkButton(main_frame, text="Close",
-                         command=dialog.destroy).pack(pady=20)
+            self.theme.register(ctk.CTkButton(main_frame, text="Close",
+                                              command=dialog.destroy)).pack(pady=20)
             
+        def show_spending_dialog(self):
+            dialog = ctk.CTkToplevel(self)
+            dialog.title("Spending History")
+            dialog.geometry("760x560")
+            dialog.transient(self)
+
+            top_frame = ctk.CTkFrame(dialog, fg_color="transparent")
+            top_frame.pack(fill="x", padx=20, pady=(20, 5))
+
+            this_month = month_index(date.today())
+            first = min((self.projections.first_month(sub.get("date_added")) or this_month
+                         for sub in self.subscriptions), default=this_month)
+            ranges = {
+                "Past 12 months": (this_month - 11, this_month),
+                "Next 12 months": (this_month, this_month + 11),
+                "Past and next 12 months": (this_month - 11, this_month + 12),
+                "Since the first subscription": (min(first, this_month), this_month),
+                "Next 5 years": (this_month, this_month + 59),
+            }
+            range_var = ctk.StringVar(value="Past and next 12 months")
+            ctk.CTkOptionMenu(top_frame, values=list(ranges), variable=range_var,
+                              command=lambda choice: draw()).pack(side="left")
+            summary = ctk.CTkLabel(top_frame, text="", justify="left")
+            summary.pack(side="left", padx=15)
+
+            dark = ctk.get_appearance_mode() == "Dark"
+            canvas = tkinter.Canvas(dialog, height=300, highlightthickness=0,
+                                    bg="#2b2b2b" if dark else "#ebebeb")
+            canvas.pack(fill="both", expand=True, padx=20, pady=5)
+
+            services_box = ctk.CTkTextbox(dialog, height=140)
+            services_box.pack(fill="x", padx=20, pady=(5, 20))
+
+            def draw():
+                currency = self.settings.get("display_currency", DEFAULT_CURRENCY)
+                start, end = ranges[range_var.get()]
+                data = self.projections.project(start, end, currency, top=10)
+                spend, cumulative = data["spend"], data["cumulative"]
+
+                total = cumulative[-1] if cumulative else 0
+                text = f"Total {format_money(total, currency)} over {len(spend)} months"
+                if data["unconverted"]:
+                    text += f"  (no rate for {', '.join(data['unconverted'])})"
+                summary.configure(text=text)
+
+                canvas.delete("all")
+                width, height = canvas.winfo_width(), canvas.winfo_height()
+                pad = 30
+                if not spend or width <= 2 * pad or height <= 2 * pad:
+                    return
+                ink = "#dddddd" if dark else "#333333"
+                bar_color = self.get_color(self.settings.get("hue", 200))
+                peak = max(max(spend), 1)
+                step = (width - 2 * pad) / len(spend)
+                # Monthly spend as bars
+                for i, amount in enumerate(spend):
+                    x = pad + i * step
+                    bar_height = float(amount / peak) * (height - 2 * pad)
+                    canvas.create_rectangle(x + 1, height - pad - bar_height, x + step - 1,
+                                            height - pad, fill=bar_color, width=0)
+                # Running total as a line on its own scale
+                top_total = max(float(cumulative[-1]), 1)
+                points = []
+                for i, amount in enumerate(cumulative):
+                    points += [pad + (i + 0.5) * step,
+                               height - pad - float(amount) / top_total * (height - 2 * pad)]
+                if len(points) >= 4:
+                    canvas.create_line(*points, fill=ink, width=2)
+                canvas.create_text(pad, pad / 2, anchor="w", fill=ink,
+                                   text=f"peak month {format_money(peak, currency)}")
+                canvas.create_text(width - pad, pad / 2, anchor="e", fill=ink,
+                                   text=f"cumulative {format_money(cumulative[-1], currency)}")
+                labels = data["months"]
+                every = max(1, len(labels) // 8)
+                for i in range(0, len(labels), every):
+                    canvas.create_text(pad + (i + 0.5) * step, height - pad / 2, fill=ink,
+                                       text=labels[i])
+
+                services_box.configure(state="normal")
+                services_box.delete("1.0", "end")
+                lines = [f"{format_money(amount, currency):>14}  {name}"
+                         for _, name, amount in data["services"]]
+                if data["other"]:
+                    lines.append(f"{format_money(data['other'], currency):>14}  everything else")
+                services_box.insert("1.0", "\n".join(lines))
+                services_box.configure(state="disabled")
+
+            canvas.bind("<Configure>", lambda event: draw())
+
         def get_color(self, hue, s=0.8, v=0.9):
-            rgb = tuple(int(x * 255) for x in colorsys.hsv_to_rgb(hue/360, s, v))
-            return "#{:02x}{:02x}{:02x}".format(*rgb)
+            return hue_to_color(hue, s, v)
             
         def apply_color_theme(self, hue):
-            main_color = self.get_color(hue)
-            hover_color = self.get_color(hue, s=0.7, v=0.8)
-
             self.settings["hue"] = hue
             self.save_settings()
-
-            # Update all buttons in the application
-            def update_button_colors(widget):
-                if isinstance(widget, ctk.CTkButton):
-                    widget.configure(fg_color=main_color, hover_color=hover_color)
-                for child in widget.winfo_children():
-                    update_button_colors(child)
-
-            update_button_colors(self)
+            # Throttled, repeated slider callbacks within a frame collapse
+            self.theme.set_hue(hue)
 
         def toggle_notification_enabled(self, switch):
             self.settings["notifications_enabled"] = switch.get() == 1
             self.save_settings()
+            self.restart_renewal_scheduler()
+
+        def set_display_currency(self, currency):
+            self.settings["display_currency"] = currency
+            self.save_settings()
+            self.update_totals()
+
+        def toggle_diagnostics(self, switch):
+            diag.enable(switch.get() == 1)
+            self.settings["diagnostics_enabled"] = diag.enabled
+            self.save_settings()
 
         def toggle_notification_push(self, switch):
             self.settings["notification_push"] = switch.get() == 1
@@ -432,199 +3924,1267 @@ if HAS_TK:
         def update_setting(self, key, value):
             self.settings[key] = value
             self.save_settings()
+            if key == "notification_when":
+                self.restart_renewal_scheduler()
+
+        def notification_lead_days(self):
+            return NOTIFICATION_LEAD_DAYS.get(self.settings.get("notification_when"), 3)
+
+        def restart_renewal_scheduler(self):
+            if self.renewal_scheduler is not None:
+                self.renewal_scheduler.stop()
+                self.renewal_scheduler = None
+            if self.settings.get("notifications_enabled"):
+                # The notified set carries over, a settings change doesn't repeat them
+                self.renewal_scheduler = RenewalScheduler(
+                    lambda: self.store.renewals, self.notification_lead_days(),
+                    self.due_notifications.put, self.notified_renewals).start()
+
+        def show_due_notification(self, due):
+            # One notification for everything that came due, however many rows
+            if len(due) == 1:
+                renewal, sub = due[0]
+                title = f"{sub['name']} renews {renewal.strftime('%b %d')}"
+            else:
+                title = f"{len(due)} subscriptions renew soon"
+            message = self.settings.get("notification_custom_text", "Your subscription is due soon!")
+            if len(due) > 1:
+                lines = [f"{sub['name']} ({renewal.strftime('%b %d')})" for renewal, sub in due[:5]]
+                if len(due) > 5:
+                    lines.append(f"and {len(due) - 5} more")
+                message += "\n" + "\n".join(lines)
+
+            # Remember them across restarts, past renewals can be forgotten
+            today = date.today().isoformat()
+            keys = {key for key in self.settings.get("notified_renewals", [])
+                    if key.rpartition(":")[2] >= today}
+            keys.update(renewal_key(sub["id"], renewal) for renewal, sub in due)
+            self.settings["notified_renewals"] = sorted(keys)
+            self.save_settings()
+
+            if self.settings.get("notification_push") and desktop_notifications_available():
+                # notify-send can take seconds, don't hold up the Tk loop
+                threading.Thread(target=send_desktop_notification, args=(title, message),
+                                 name="subber-notify", daemon=True).start()
+            else:
+                messagebox.showinfo(title, message)
+
+        def update_due_soon(self):
+            due = self.store.renewals.due_within(self.notification_lead_days())
+            if not due:
+                self.due_soon.configure(text="")
+                return
+            lines = [f"{sub['name']} ({renewal.strftime('%b %d')})" for renewal, sub in due[:3]]
+            if len(due) > 3:
+                lines.append(f"and {len(due) - 3} more")
+            self.due_soon.configure(text="Due soon:\n" + "\n".join(lines))
             
         def update_totals(self):
-            monthly_total = 0
-            yearly_total = 0
-            
-            for sub in self.subscriptions:
-                if sub['cycle'] == 'Monthly':
-                    monthly_total += sub['price']
-                    yearly_total += sub['price'] * 12
-                else:  # Yearly
-                    monthly_total += sub['price'] / 12
-                    yearly_total += sub['price']
-            
-            self.monthly_total.configure(text=f"Monthly Total: ${monthly_total:.2f}")
-            self.yearly_total.configure(text=f"Yearly Total: ${yearly_total:.2f}")
+            with diag.span("ui.update_totals"):
+                self.refresh_totals()
+
+        def refresh_totals(self):
+            currency = self.settings.get("display_currency", DEFAULT_CURRENCY)
+            monthly_total, yearly_total, unconverted = self.currency_totals.totals(currency)
+
+            self.monthly_total.configure(text=f"Monthly Total: {format_money(monthly_total, currency)}")
+            yearly_text = f"Yearly Total: {format_money(yearly_total, currency)}"
+            if unconverted:
+                yearly_text += f"\n(no rate for {', '.join(sorted(unconverted))})"
+            self.yearly_total.configure(text=yearly_text)
+            self.update_due_soon()
+            if self.renewal_scheduler is not None:
+                self.renewal_scheduler.wake()
         
         def refresh_subscription_list(self):
-            # Clear existing items
-            for widget in self.main_frame.winfo_children():
-                widget.destroy()
-                
             self.update_totals()
-                
-            # Add subscription cards
-            for sub in self.subscriptions:
-                card = ctk.CTkFrame(self.main_frame)
-                card.pack(fill="x", pady=5, padx=5)
-                
-                # Header frame for icon and name
-                header_frame = ctk.CTkFrame(card, fg_color="transparent")
-                header_frame.pack(fill="x", pady=5)
-                
-                # Display icon if available
-                if "icon" in sub:
-                    try:
-                        icon_data = bytes.fromhex(sub["icon"])
-                        icon_image = Image.open(io.BytesIO(icon_data))
-                        icon_image = icon_image.resize((24, 24))  # Resize icon
-                        icon_photo = ctk.CTkImage(light_image=icon_image,
-                                                dark_image=icon_image,
-                                                size=(24, 24))
-                        ctk.CTkLabel(header_frame, image=icon_photo, text="").pack(side="left", padx=5)
-                    except Exception as e:
-                        print(f"Error loading icon: {e}")
-                
-                name_label = ctk.CTkLabel(header_frame, text=sub["name"],
-                            font=ctk.CTkFont(size=16, weight="bold"))
-                name_label.pack(side="left", pady=5)
-                
-                price_text = f"${sub['price']:.2f} {sub['cycle']}"
-                yearly_cost = sub['price'] * (1 if sub['cycle'] == 'Yearly' else 12)
-                monthly_cost = sub['price'] * (1/12 if sub['cycle'] == 'Yearly' else 1)
-                price_text += f" (${monthly_cost:.2f}/mo, ${yearly_cost:.2f}/yr)"
-                ctk.CTkLabel(card, text=price_text).pack()
-                
-                ctk.CTkLabel(card, text=f"Added: {sub['date_added']}").pack(pady=5)
-                
-                button_frame = ctk.CTkFrame(card, fg_color="transparent")
-                button_frame.pack(pady=5)
-                
-                if 'website' in sub:
-                    def open_website(url=sub['website']):
-                        webbrowser.open(url)
-                    
-                    ctk.CTkButton(button_frame, text="Visit Website",
-                                 command=open_website).pack(side="left", padx=5)
-                
-                def delete_sub(s=sub):
-                    confirm = messagebox.askyesno("Delete Subscription",
-                                                  f"Are you sure you want to delete {s['name']}?")
-                    if confirm:
-                        self.subscriptions.remove(s)
-                        self.save_subscriptions()
-                        self.refresh_subscription_list()
-                    
-                ctk.CTkButton(button_frame, text="Delete",
-                             command=delete_sub,
-                             fg_color="red").pack(side="left", padx=5)
-        
-        def fetch_website_info(self, url):
-            """Fetch website title and icon from a given URL."""
-            if not url:
-                return None, None
+            self.apply_filter()
+
+        def filter_active(self):
+            return bool(self.search_var.get().strip()) or self.sort_var.get() != "Added order"
+
+        def schedule_filter(self):
+            # Wait for a pause in typing before filtering
+            if self._filter_job is not None:
+                self.after_cancel(self._filter_job)
+            self._filter_job = self.after(120, self.apply_filter)
 
+        def apply_filter(self):
+            self._filter_job = None
+            sort, descending = SORT_OPTIONS[self.sort_var.get()]
+            with diag.span("ui.filter"):
+                self.main_frame.set_items(self.store.search.view(sort, self.search_var.get(), descending))
+
+        def apply_records(self, records):
+            """Apply add/update/delete records as one store commit, then update
+            the totals and the list once for the whole batch."""
+            if not records:
+                return
+            self.store.apply_batch(records)
+            self.update_totals()
+            if self.filter_active() or any(record["op"] == "add" for record in records):
+                self.apply_filter()
+            else:
+                for record in records:
+                    if record["op"] == "delete":
+                        self.fetcher.cancel(record["id"])
+                        self.main_frame.remove(record["id"])
+                    else:
+                        self.main_frame.update_item(record["id"])
+
+        def add_subscription(self, sub):
+            sub = self.store.add(sub)
+            self.update_totals()
+            if self.filter_active():
+                self.apply_filter()
+            else:
+                self.main_frame.insert(sub["id"])
+
+        def update_subscription(self, sub_id, **changes):
+            if self.store.update(sub_id, changes) is None:
+                return
+            self.update_totals()
+            if self.filter_active() and any(field in changes for field in SEARCH_FIELDS):
+                self.apply_filter()
+            else:
+                self.main_frame.update_item(sub_id)
+
+        def delete_subscription(self, sub_id):
+            if self.store.delete(sub_id) is None:
+                return
+            self.fetcher.cancel(sub_id)
+            self.update_totals()
+            self.main_frame.remove(sub_id)
+
+        def confirm_delete_subscription(self, sub_id):
+            sub = self.subscriptions_by_id.get(sub_id)
+            if sub is None:
+                return
+            confirm = messagebox.askyesno("Delete Subscription",
+                                          f"Are you sure you want to delete {sub['name']}?")
+            if confirm:
+                self.delete_subscription(sub_id)
+
+        def open_subscription_website(self, sub_id):
+            sub = self.subscriptions_by_id.get(sub_id)
+            if sub and sub.get("website"):
+                webbrowser.open(sub["website"])
+
+        def load_icon(self, icon_id):
+            return self.icon_cache.get(icon_id)
+
+        def build_icon_image(self, icon_id):
+            # Icons are stored pre-resized for each scaling, so this is only a PNG decode
+            size = round(ICON_SIZE[0] * self.scaling_factor)
             try:
-                # Ensure URL has proper scheme
-                if not url.startswith(('http://', 'https://')):
-                    url = 'https://' + url
+                with diag.span("icon.decode"):
+                    icon_image = self.icon_store.open(icon_id, size)
+                return ctk.CTkImage(light_image=icon_image,
+                                    dark_image=icon_image,
+                                    size=ICON_SIZE)
+            except Exception as e:
+                print(f"Error loading icon: {e}")
+                return None
 
-                # Fetch website content
-                response = requests.get(url, timeout=5)
-                response.raise_for_status()
-                soup = BeautifulSoup(response.text, 'html.parser')
+        def is_fetch_pending(self, sub_id):
+            return sub_id in self.pending_fetches
+
+        def placeholder_icon(self):
+            if self._placeholder_icon is None:
+                blank = Image.new("RGBA", ICON_SIZE, (128, 128, 128, 90))
+                self._placeholder_icon = ctk.CTkImage(light_image=blank, dark_image=blank,
+                                                      size=ICON_SIZE)
+            return self._placeholder_icon
 
-                # Get title
-                title = soup.title.string if soup.title else None
+        def refresh_all_icons(self):
+            for sub in self.subscriptions:
+                if sub.get("website") and sub["id"] not in self.pending_fetches:
+                    self.pending_fetches.add(sub["id"])
+                    self.fetcher.submit(sub["id"], sub["website"], revalidate=True)
+                    self.main_frame.update_item(sub["id"])
 
-                # Get icon
-                icon_data = None
-                if HAS_FAVICON:
-                    icons = favicon.get(url, timeout=5)
-                    if icons:
-                        # Get the largest icon
-                        icon = max(icons, key=lambda x: x.width if x.width else 0)
-                        icon_response = requests.get(icon.url, timeout=5)
-                        if icon_response.status_code == 200:
-                            icon_data = icon_response.content
+        def poll_fetch_results(self):
+            # Apply everything that finished since the last tick, as one commit
+            records = []
+            finished = []
+            for sub_id, title, icon_id in self.fetcher.drain():
+                self.pending_fetches.discard(sub_id)
+                finished.append(sub_id)
+                changes = {}
+                if title:
+                    changes["title"] = title
+                if icon_id:
+                    changes["icon_id"] = icon_id
+                # Deleted while its fetch was running
+                if changes and self.store.get(sub_id) is not None:
+                    records.append({"op": "update", "id": sub_id, "changes": changes})
+            if records:
+                self.store.apply_batch(records)
+                self.fetcher.flush()
+            for sub_id in finished:
+                self.main_frame.update_item(sub_id)
+            due = []
+            while not self.due_notifications.empty():
+                due.extend(self.due_notifications.get_nowait())
+            if due:
+                self.show_due_notification(due)
+            self.after(100, self.poll_fetch_results)
 
-                return title, icon_data
+        def watch_remote_store(self):
+            while not self.closing.is_set():
+                try:
+                    fetched = self.store.fetch_changes()
+                except Exception as e:
+                    print(f"Error checking for changes: {e}")
+                    fetched = None
+                if fetched is not None:
+                    self.remote_changes.put(fetched)
+                self.closing.wait(1)
 
+        def poll_external_changes(self):
+            # Pick up edits made by other running instances or the CLI
+            events = []
+            try:
+                if isinstance(self.store, RemoteStore):
+                    # Only the latest fetch matters
+                    fetched = None
+                    while not self.remote_changes.empty():
+                        fetched = self.remote_changes.get_nowait()
+                    if fetched is not None:
+                        events = self.store.merge_changes(fetched)
+                else:
+                    events = self.store.poll_changes()
             except Exception as e:
-                print(f"Error fetching website info: {e}")
-                return None, None
+                print(f"Error checking for changes: {e}")
+            if self.rates.refresh() and not events:
+                self.update_totals()
+            if events:
+                self.update_totals()
+                if self.filter_active() or any(op == "add" for op, _ in events):
+                    self.apply_filter()
+                else:
+                    for op, sub_id in events:
+                        if op == "delete":
+                            self.main_frame.remove(sub_id)
+                        else:
+                            self.main_frame.update_item(sub_id)
+            self.after(1000, self.poll_external_changes)
+
+        def on_close(self):
+            self.closing.set()
+            if self.renewal_scheduler is not None:
+                self.renewal_scheduler.stop()
+            self.fetcher.shutdown()
+            self.icon_pipeline.shutdown()
+            self.store.close()
+            self.settings.flush()
+            self.destroy()
 
         def load_settings(self):
-            settings_path = os.path.join(os.path.dirname(__file__), "settings.json")
-            try:
-                with open(settings_path, "r") as f:
-                    return json.load(f)
-            except FileNotFoundError:
-                return {
-                    "scaling_factor": 1.0,
-                    "appearance_mode": "dark",
-                    "hue": 200,  # Default blue-ish hue
-                    "notifications_enabled": False,
-                    "notification_when": "3 days",
-                    "notification_push": False,
-                    "notification_custom_text": "Your subscription is due soon!"
-                }
+            return SettingsStore()
 
         def save_settings(self):
-            settings_path = os.path.join(os.path.dirname(__file__), "settings.json")
-            with open(settings_path, "w") as f:
-                json.dump(self.settings, f)
+            # Debounced, the file is written once things go quiet
+            self.settings.save()
 
         def apply_scaling(self, factor):
+            self.scaling_factor = float(factor)
+            if self.main_frame is None:
+                ctk.set_widget_scaling(factor)
+                ctk.set_window_scaling(factor)
+                return
+            # CTk re-lays out every existing widget, so drop the list's
+            # off-screen cards first. Icons were rendered for the old factor.
+            self.main_frame.trim_pool()
+            self.icon_cache.clear()
+            self._placeholder_icon = None
             ctk.set_widget_scaling(factor)
             ctk.set_window_scaling(factor)
+            self.main_frame.rescale()
+
+        def font(self, size=None, weight=None, family=None):
+            """Shared CTkFont. Widgets apply their scaling to it themselves, so
+            one object serves every scaling factor."""
+            key = (family, size, weight)
+            font = self.fonts.get(key)
+            if font is None:
+                font = self.fonts[key] = ctk.CTkFont(family=family, size=size, weight=weight)
+            return font
+
+        @property
+        def subscriptions(self):
+            return self.store.subscriptions
+
+        @property
+        def subscriptions_by_id(self):
+            return self.store.by_id
 
         def save_subscriptions(self):
-            subs_path = os.path.join(os.path.dirname(__file__), "subscriptions.json")
-            with open(subs_path, "w") as f:
-                json.dump(self.subscriptions, f)
+            self.store.compact()
 
         def load_subscriptions(self):
-            subs_path = os.path.join(os.path.dirname(__file__), "subscriptions.json")
             try:
-                with open(subs_path, "r") as f:
-                    self.subscriptions = json.load(f)
-            except FileNotFoundError:
-                self.subscriptions = []
+                self.store.load()
+            except OSError as e:
+                if not isinstance(self.store, RemoteStore):
+                    raise
+                print(f"Could not reach {self.store.url}, using the local ledger: {e}")
+                self.store = open_store()
+                self.subs_path = self.store.path
+                self.icon_store = self.store.icon_store
+                self.icon_store.pipeline = self.icon_pipeline
+                self.store.load()
+    return SubscriptionTracker
+
+
+def __getattr__(name):
+    # LittleSubber.SubscriptionTracker etc. still work, they just load the GUI
+    if name in GUI_NAMES and load_gui() is not None:
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def load_subscriptions(path=None):
-    if path is None:
-        path = os.path.join(os.path.dirname(__file__), "subscriptions.json")
+    store = open_store(path)
+    subscriptions = store.load()
+    store.close()
+    return subscriptions
+
+
+def save_subscriptions(subscriptions, path=None):
+    store = open_store(path)
+    store.replace_all(subscriptions)
+    store.close()
+
+
+def format_subscription(i, s):
+    website_info = f" [{s['website']}]" if s.get('website') else ""
+    return (f"  {i}. {s['name']} - {format_money(s['price'], s.get('currency'))} ({s['cycle']}){website_info}\n"
+            f"     Added: {s.get('date_added','?')}")
+
+
+def row_text(row, key):
+    """row[key] stripped, "" when missing. Raises ValueError for non-text."""
+    value = row.get(key)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"invalid {key} {value!r}")
+    return value.strip()
+
+
+def check_price(value):
+    """value as a positive, finite float. Raises ValueError otherwise."""
+    if isinstance(value, bool):
+        raise ValueError(f"invalid price {value!r}")
     try:
-        with open(path, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
+        price = float(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"invalid price {value!r}")
+    # float("nan") and float("1e400") parse fine but can't be totalled
+    if not math.isfinite(price):
+        raise ValueError(f"invalid price {value!r}")
+    if price <= 0:
+        raise ValueError("price must be positive")
+    return price
+
+
+def normalize_subscription(row):
+    """Validate one imported or scripted row into a subscription dict.
+
+    Raises ValueError with a readable message for bad rows.
+    """
+    if not isinstance(row, Mapping):
+        raise ValueError("a subscription must be an object")
+    name = row_text(row, "name")
+    if not name:
+        raise ValueError("missing name")
+    price = check_price(row.get("price"))
+    cycle = (row_text(row, "cycle") or "Monthly").lower()
+    if cycle not in ("monthly", "yearly"):
+        raise ValueError(f"invalid cycle {row.get('cycle')!r}")
+    sub = {
+        "id": row_text(row, "id") or new_subscription_id(),
+        "name": name,
+        "price": price,
+        "cycle": cycle.capitalize(),
+        "date_added": row_text(row, "date_added") or datetime.now().strftime("%Y-%m-%d"),
+    }
+    website = row_text(row, "website")
+    if website:
+        if not website.startswith(('http://', 'https://')):
+            website = 'https://' + website
+        sub["website"] = website
+    for key in ("currency", "title", "icon_id"):
+        value = row_text(row, key)
+        if value:
+            sub[key] = value
+    return sub
+
+
+PASTE_COLUMNS = ("name", "price", "cycle", "website", "currency")
+
+
+def parse_pasted_rows(text):
+    """Rows pasted from a spreadsheet (tab separated) or typed as CSV.
+
+    A first row naming the columns (name, price, ...) is used as the header,
+    otherwise columns are taken to be PASTE_COLUMNS in that order.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
         return []
+    delimiter = "\t" if "\t" in lines[0] else ","
+    table = [[cell.strip() for cell in row] for row in csv.reader(lines, delimiter=delimiter)]
+    header = [cell.lower() for cell in table[0]]
+    if "name" in header and "price" in header:
+        columns, table = header, table[1:]
+    else:
+        columns = PASTE_COLUMNS
+    return [dict(zip(columns, row)) for row in table]
 
 
-def save_subscriptions(subscriptions, path=None):
-    if path is None:
-        path = os.path.join(os.path.dirname(__file__), "subscriptions.json")
-    with open(path, "w") as f:
-        json.dump(subscriptions, f)
+def batch_records(rows, existing):
+    """Turn raw rows into store records: rows whose id is in existing become
+    updates of the fields they fill in, the rest are added.
+
+    Returns (records, [(row number, error)]).
+    """
+    records = []
+    errors = []
+    for row_no, row in enumerate(rows, 1):
+        try:
+            sub = normalize_subscription(row)
+        except ValueError as e:
+            errors.append((row_no, str(e)))
+            continue
+        current = existing.get(sub["id"])
+        if current is None:
+            records.append({"op": "add", "sub": sub})
+            continue
+        changes = {key: value for key, value in sub.items()
+                   if key != "id" and row.get(key) and current.get(key) != value}
+        if changes:
+            records.append({"op": "update", "id": sub["id"], "changes": changes})
+    return records, errors
+
+
+EDITABLE_FIELDS = frozenset(("name", "price", "cycle", "website", "date_added",
+                             "currency", "title", "icon_id"))
+RECORD_OPS = ("add", "update", "delete")
+
+
+def normalize_changes(changes):
+    """Validate the fields of an update like normalize_subscription does for
+    new rows. The id and unknown fields can't be changed.
+
+    Raises ValueError with a readable message.
+    """
+    if not isinstance(changes, dict):
+        raise ValueError("changes must be an object")
+    unknown = set(changes) - EDITABLE_FIELDS
+    if unknown:
+        raise ValueError(f"can't change {', '.join(sorted(unknown))}")
+    # Placeholders for the required fields that aren't being changed
+    checked = normalize_subscription({"name": "-", "price": 1, **changes})
+    return {key: checked.get(key, changes[key]) for key in changes}
+
+
+def normalize_record(record):
+    """Validate one add/update/delete record before it is applied or logged.
+
+    Raises ValueError with a readable message.
+    """
+    if not isinstance(record, dict) or record.get("op") not in RECORD_OPS:
+        raise ValueError(f"op must be one of {', '.join(RECORD_OPS)}")
+    if record["op"] == "add":
+        if not isinstance(record.get("sub"), dict):
+            raise ValueError("add needs a sub object")
+        return {"op": "add", "sub": normalize_subscription(record["sub"])}
+    if not isinstance(record.get("id"), str) or not record["id"]:
+        raise ValueError(f"{record['op']} needs an id")
+    if record["op"] == "delete":
+        return {"op": "delete", "id": record["id"]}
+    return {"op": "update", "id": record["id"], "changes": normalize_changes(record.get("changes"))}
 
 
-def run_cli():
-    subs = load_subscriptions()
+EXPORT_FIELDS = ("id", "name", "price", "cycle", "website", "date_added", "currency", "title", "icon_id")
+
+
+def guess_format(path, default="jsonl"):
+    ext = os.path.splitext(path)[1].lower()
+    return {".csv": "csv", ".json": "json", ".jsonl": "jsonl", ".ndjson": "jsonl"}.get(ext, default)
+
+
+def read_rows(stream, fmt):
+    """Yield raw rows one at a time from a CSV, JSON Lines or JSON stream."""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "jsonl":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        # A JSON array, or a whole ledger file
+        yield from ledger_rows(json.load(stream))[0]
+
+
+def write_rows(subs, stream, fmt):
+    """Stream subscriptions out as CSV, JSON Lines or a JSON array."""
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for sub in subs:
+            writer.writerow(sub)
+            count += 1
+    elif fmt == "jsonl":
+        for sub in subs:
+            stream.write(json.dumps(sub, default=json_default) + "\n")
+            count += 1
+    else:
+        stream.write("[")
+        for sub in subs:
+            stream.write((",\n" if count else "\n") + json.dumps(sub, default=json_default))
+            count += 1
+        stream.write("\n]\n")
+    return count
+
+
+def open_input(path):
+    return sys.stdin if path == "-" else open(path, "r", newline="", encoding="utf-8")
+
+
+def open_output(path):
+    return sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+
+
+def cli_add(store, args):
+    try:
+        sub = normalize_subscription({"name": args.name, "price": args.price, "cycle": args.cycle,
+                                      "website": args.website, "currency": args.currency})
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    store.add(sub)
+    print(json.dumps(sub) if args.json else sub["id"])
+    return 0
+
+
+def cli_delete(store, args):
+    missing = 0
+    for sub_id in args.ids:
+        removed = store.delete(sub_id)
+        if removed is None:
+            print(f"No subscription with id {sub_id}", file=sys.stderr)
+            missing += 1
+        elif not args.quiet:
+            print(f"Removed {removed['name']}")
+    return 1 if missing else 0
+
+
+def cli_list(store, args):
+    limit = None if args.all else args.per_page
+    offset = 0 if args.all else (args.page - 1) * args.per_page
+    if args.search or args.sort:
+        # Answered from the in-memory search index
+        store.ensure_loaded()
+        ids = store.search.view(args.sort or "order", args.search, args.desc)
+        subs = (store.get(sub_id) for sub_id in ids)
+        if args.name or args.cycle:
+            needle = (args.name or "").lower()
+            subs = (sub for sub in subs if needle in sub["name"].lower()
+                    and (not args.cycle or sub["cycle"] == args.cycle))
+        matches = list(subs)
+        total = len(matches)
+        page = matches[offset:None if limit is None else offset + limit]
+    else:
+        total, page = store.query(name=args.name, cycle=args.cycle, offset=offset, limit=limit)
+    if args.format != "text":
+        write_rows(page, sys.stdout, args.format)
+        return 0
+    if not page:
+        print("  (no subscriptions)")
+    for i, sub in enumerate(page, offset + 1):
+        print(format_subscription(i, sub))
+    if limit is not None and total > limit:
+        pages = math.ceil(total / limit)
+        print(f"\nPage {args.page} of {pages} ({total} subscriptions)")
+    return 0
+
+
+def display_currency():
+    return SettingsStore().get("display_currency") or DEFAULT_CURRENCY
+
+
+def cli_totals(store, args):
+    currency = args.currency or display_currency()
+    rates = rates_for(args.file or default_subscriptions_path())
+    monthly_total, yearly_total, unconverted = CurrencyTotals(store, rates).totals(currency)
+    if args.json:
+        breakdown = [{"currency": source, "cycle": cycle, "sum": str(amount)}
+                     for (source, cycle), amount in sorted(store.breakdown().items())]
+        print(json.dumps({"currency": currency, "monthly": str(monthly_total),
+                          "yearly": str(yearly_total), "breakdown": breakdown,
+                          "unconverted": sorted(unconverted)}))
+    else:
+        print(f"Monthly: {format_money(monthly_total, currency)}")
+        print(f"Yearly:  {format_money(yearly_total, currency)}")
+        for source, (monthly, yearly) in sorted(unconverted.items()):
+            print(f"  not included, no {source} rate: {format_money(monthly, source)} monthly")
+    return 0
+
+
+def cli_history(store, args):
+    this_month = month_index(date.today())
+    start = parse_month(args.start) if args.start else this_month - 11
+    end = parse_month(args.end) if args.end else this_month
+    if start is None or end is None or end < start:
+        print("Error: give months as YYYY-MM, --from before --to", file=sys.stderr)
+        return 1
+    currency = args.currency or display_currency()
+    engine = ProjectionEngine(store, rates_for(args.file or default_subscriptions_path()))
+    data = engine.project(start, end, currency, top=args.top)
+    if args.json:
+        print(json.dumps({
+            "currency": currency,
+            "months": [{"month": month, "spend": str(spend), "cumulative": str(total)}
+                       for month, spend, total in zip(data["months"], data["spend"], data["cumulative"])],
+            "services": [{"id": sub_id, "name": name, "total": str(total)}
+                         for sub_id, name, total in data["services"]],
+            "other": str(data["other"]),
+            "unconverted": data["unconverted"],
+        }))
+        return 0
+    for month, spend, total in zip(data["months"], data["spend"], data["cumulative"]):
+        print(f"  {month}  {format_money(spend, currency):>14}  {format_money(total, currency):>14}")
+    if data["services"]:
+        print("\nMost expensive over the range:")
+        for _, name, total in data["services"]:
+            print(f"  {format_money(total, currency):>14}  {name}")
+    if data["unconverted"]:
+        print(f"\nNot included, no rate for {', '.join(data['unconverted'])}")
+    return 0
+
+
+def cli_rates(store, args):
+    rates = rates_for(args.file or default_subscriptions_path())
+    if args.set:
+        currency, rate = args.set
+        try:
+            if Decimal(rate) <= 0:
+                raise ArithmeticError
+        except ArithmeticError:
+            print(f"Error: invalid rate {rate!r}", file=sys.stderr)
+            return 1
+        rates.set_rate(currency.upper(), rate)
+        print(f"1 {currency.upper()} = {rate} {rates.base}")
+        return 0
+    source = rates.path if os.path.exists(rates.path) else "built-in defaults"
+    print(f"Rates in {rates.base} ({source}, updated {rates.updated or 'never'}):")
+    for currency in rates.currencies():
+        print(f"  {currency}  {rates.rates[currency]}")
+    return 0
+
+
+def cli_due(store, args):
+    store.ensure_loaded()
+    due = store.renewals.due_within(args.days)
+    if args.json:
+        print(json.dumps([{"renewal": renewal.isoformat(), **sub} for renewal, sub in due]))
+        return 0
+    if not due:
+        print(f"Nothing renews in the next {args.days} days")
+    for renewal, sub in due:
+        print(f"  {renewal.isoformat()}  {sub['name']} - "
+              f"{format_money(sub['price'], sub.get('currency'))} ({sub['cycle']})")
+    return 0
+
+
+def cli_import(store, args):
+    fmt = args.format or guess_format(args.path)
+    subs = []
+    errors = 0
+    with open_input(args.path) as stream:
+        for line_no, row in enumerate(read_rows(stream, fmt), 1):
+            try:
+                subs.append(normalize_subscription(row))
+            except ValueError as e:
+                errors += 1
+                print(f"Skipping row {line_no}: {e}", file=sys.stderr)
+    # One commit for the whole file
+    count = store.add_many(subs)
+    print(f"Imported {count} subscriptions" + (f", skipped {errors}" if errors else ""))
+    return 1 if errors and not count else 0
+
+
+def cli_export(store, args):
+    fmt = args.format or guess_format(args.path)
+    stream = open_output(args.path)
+    try:
+        count = write_rows(store.iter_subscriptions(), stream, fmt)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    if args.path != "-":
+        print(f"Exported {count} subscriptions")
+    return 0
+
+
+def cli_optimize_icons(store, args):
+    if isinstance(store, RemoteStore):
+        print("Error: optimize-icons works on a local ledger", file=sys.stderr)
+        return 1
+    store.ensure_loaded()
+    icon_store = store.icon_store
+    cache = MetadataCache(os.path.join(os.path.dirname(store.path), "fetch_cache.json"))
+    old_ids = sorted({sub["icon_id"] for sub in store.iter_subscriptions() if sub.get("icon_id")}
+                     | cache.icon_ids())
+
+    # Re-encode from the biggest copy kept of each icon
+    sources = {}
+    before = 0
+    for icon_id in old_ids:
+        copies = [png for png in (icon_store.read(icon_id, size) for size in (None,) + ICON_VARIANT_SIZES)
+                  if png is not None]
+        if copies:
+            sources[icon_id] = copies[-1]
+            before += sum(map(len, copies))
+    ids = list(sources)
+    pipeline = IconPipeline(args.workers)
+    try:
+        results = pipeline.encode_many([sources[icon_id] for icon_id in ids])
+    finally:
+        pipeline.shutdown()
+
+    mapping = {}
+    written = {}
+    for old_id, encoded in zip(ids, results):
+        if encoded is None:
+            continue
+        base, variants = encoded
+        new_id = hashlib.sha1(base).hexdigest()
+        mapping[old_id] = new_id
+        written.setdefault(new_id, (base, variants))
+    # Replace files in place: an old id can be the new id of another icon
+    for icon_id in set(mapping) - set(written):
+        icon_store.remove(icon_id)
+    after = 0
+    for icon_id, (base, variants) in written.items():
+        icon_store.remove(icon_id)
+        icon_store.write(icon_id, base)
+        for size, png in variants.items():
+            icon_store.write(icon_id, png, size)
+        after += len(base) + sum(map(len, variants.values()))
+
+    records = [{"op": "update", "id": sub["id"], "changes": {"icon_id": mapping[sub["icon_id"]]}}
+               for sub in store.iter_subscriptions()
+               if sub.get("icon_id") in mapping and mapping[sub["icon_id"]] != sub["icon_id"]]
+    if records:
+        store.apply_batch(records)
+    cache.remap_icons(mapping)
+    cache.flush()
+
+    print(f"Optimized {len(mapping)} icons, {len(mapping) - len(written)} duplicates merged, "
+          f"{len(records)} subscriptions updated")
+    print(f"{before:,} bytes before, {after:,} after, {before - after:,} saved")
+    return 0
+
+
+SERVER_PORT = 8765
+SERVER_PAGE_SIZE = 500
+
+
+def make_sync_server(store, host="127.0.0.1", port=SERVER_PORT):
+    """HTTP server sharing one loaded store with other machines and scripts.
+
+    GET    /subscriptions?offset=&limit=&name=&cycle=   paginated list
+    GET    /subscriptions/<id>
+    POST   /subscriptions            one subscription or a list of them
+    PATCH  /subscriptions/<id>       changed fields
+    DELETE /subscriptions/<id>
+    POST   /batch                    {"records": [...]} as one commit
+    GET    /totals?currency=
+
+    Connections are kept alive and GETs carry an ETag built from the store
+    revision, so polling an unchanged ledger is answered with a bare 304.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    # The stores aren't thread-safe, requests take turns
+    lock = threading.Lock()
+    # Revisions restart with the server, the token keeps old ETags from matching
+    token = uuid.uuid4().hex[:8]
+    rates = rates_for(store.path)
+    currency_totals = CurrencyTotals(store, rates)
+
+    class SyncHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        server_version = "SUBmarine"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body, etag=None):
+            data = json.dumps(body, default=json_default).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if etag:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"null")
+
+        def route(self):
+            parsed = urlparse(self.path)
+            parts = [part for part in parsed.path.split("/") if part]
+            query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+            return parts, query
+
+        def handle_request(self, method):
+            try:
+                parts, query = self.route()
+                with lock:
+                    # Pick up edits made straight to the file by other processes
+                    store.poll_changes()
+                    status, body, etag = self.dispatch(method, parts, query)
+            except (ValueError, KeyError, TypeError, AttributeError, ArithmeticError) as e:
+                # Malformed input that slipped past validation still gets an answer
+                status, body, etag = 400, {"error": f"bad request: {e}"}, None
+            if etag and status == 200 and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_json(status, body, etag)
+
+        def dispatch(self, method, parts, query):
+            etag = f'"{token}-{store.revision}"'
+            if parts == ["totals"] and method == "GET":
+                breakdown = [{"currency": currency, "cycle": cycle, "sum": str(amount)}
+                             for (currency, cycle), amount in sorted(store.breakdown().items())]
+                if not query.get("currency"):
+                    monthly, yearly = store.totals()
+                    return 200, {"monthly": str(monthly), "yearly": str(yearly),
+                                 "breakdown": breakdown}, etag
+                # ?currency=EUR converts with the server's rates.json
+                rates.refresh()
+                currency = query["currency"].upper()
+                monthly, yearly, unconverted = currency_totals.totals(currency)
+                return 200, {"currency": currency, "monthly": str(monthly), "yearly": str(yearly),
+                             "breakdown": breakdown, "unconverted": sorted(unconverted)}, \
+                    f'"{token}-{store.revision}-{rates.version}"'
+            if parts == ["batch"] and method == "POST":
+                records = self.read_json()["records"]
+                if not isinstance(records, list):
+                    raise ValueError("records must be a list")
+                # All or nothing: one bad record rejects the batch before anything is logged
+                records = [normalize_record(record) for record in records]
+                previous = f'"{token}-{store.revision}"'
+                store.apply_batch(records)
+                # The ETags before and after let the client skip its own changes when polling
+                return 200, {"applied": len(records), "previous": previous,
+                             "etag": f'"{token}-{store.revision}"'}, None
+            if not parts or parts[0] != "subscriptions" or len(parts) > 2:
+                return 404, {"error": "not found"}, None
+
+            if len(parts) == 1:
+                if method == "GET":
+                    offset = int(query.get("offset", 0))
+                    limit = int(query.get("limit", SERVER_PAGE_SIZE))
+                    total, page = store.query(name=query.get("name"), cycle=query.get("cycle"),
+                                              offset=offset, limit=limit)
+                    return 200, {"total": total, "offset": offset, "subscriptions": page}, etag
+                if method == "POST":
+                    body = self.read_json()
+                    subs = [normalize_subscription(row)
+                            for row in (body if isinstance(body, list) else [body])]
+                    store.add_many(subs)
+                    return 201, subs if isinstance(body, list) else subs[0], None
+                return 405, {"error": "method not allowed"}, None
+
+            sub_id = parts[1]
+            if method == "GET":
+                sub = store.get(sub_id)
+            elif method == "PATCH":
+                sub = store.update(sub_id, normalize_changes(self.read_json()))
+            elif method == "DELETE":
+                sub = store.delete(sub_id)
+            else:
+                return 405, {"error": "method not allowed"}, None
+            if sub is None:
+                return 404, {"error": f"no subscription with id {sub_id}"}, None
+            return 200, sub, etag if method == "GET" else None
+
+        def do_GET(self):
+            self.handle_request("GET")
+
+        def do_POST(self):
+            self.handle_request("POST")
+
+        def do_PATCH(self):
+            self.handle_request("PATCH")
+
+        def do_DELETE(self):
+            self.handle_request("DELETE")
+
+    server = ThreadingHTTPServer((host, port), SyncHandler)
+    server.daemon_threads = True
+    server.store = store
+    return server
+
+
+class RemoteStore(SubscriptionStore):
+    """SubscriptionStore API on top of a LittleSubber serve instance.
+
+    Like SqliteSubscriptionStore it answers queries from the server until
+    load() is called. After that it keeps a local copy, sends every commit
+    to the server as one /batch request and poll_changes() keeps the copy
+    current with a conditional GET.
+    """
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.path = self.url
+        self.log_path = None
+        self.compact_every = 0
+        self.icon_store = icon_store_for(default_subscriptions_path())
+        self.by_id = {}
+        self.aggregator = TotalsAggregator()
+        self._renewals = None
+        self._search = None
+        self.revision = 0
+        self._loaded = False
+        self._etag = None
+        self._session = get_http_session()
+
+    def _request(self, method, path, **kwargs):
+        response = self._session.request(method, self.url + path, timeout=FETCH_TIMEOUT, **kwargs)
+        if response.status_code >= 400 and response.status_code != 404:
+            raise OSError(f"{method} {path} failed: {response.status_code} {response.text}")
+        return response
+
+    def _fetch(self, etag=None):
+        """(every subscription, their ETag), or (None, etag) if the ledger
+        still matches etag. Leaves the store alone, any thread can call it."""
+        subs = []
+        offset = 0
+        fresh_etag = etag
+        while True:
+            headers = {"If-None-Match": etag} if etag and offset == 0 else {}
+            response = self._request("GET", "/subscriptions", headers=headers,
+                                     params={"offset": offset, "limit": SERVER_PAGE_SIZE})
+            if response.status_code == 304:
+                return None, etag
+            if offset == 0:
+                fresh_etag = response.headers.get("ETag")
+            page = response.json()
+            subs.extend(page["subscriptions"])
+            offset += len(page["subscriptions"])
+            if not page["subscriptions"] or offset >= page["total"]:
+                return subs, fresh_etag
+
+    def _fetch_all(self, etag=None):
+        """Every subscription, or None if the ledger still matches etag."""
+        subs, self._etag = self._fetch(etag)
+        return subs
+
+    def load(self):
+        self.by_id = {}
+        for sub in self._fetch_all():
+            self._put(sub)
+        self._rebuild_indexes()
+        self._loaded = True
+        return self.subscriptions
+
+    def poll_changes(self):
+        fetched = self.fetch_changes()
+        return [] if fetched is None else self.merge_changes(fetched)
+
+    def fetch_changes(self):
+        """The network half of poll_changes(), safe off the Tk thread.
+
+        Returns what to pass to merge_changes(), None if nothing changed.
+        """
+        if not self._loaded:
+            return None
+        revision = self.revision
+        fresh, etag = self._fetch(self._etag)
+        return None if fresh is None else (revision, fresh, etag)
+
+    def merge_changes(self, fetched):
+        """Apply what fetch_changes() found. If something was committed here
+        in the meantime it is stale, drop it and fetch everything next time."""
+        revision, fresh, etag = fetched
+        if revision != self.revision:
+            self._etag = None
+            return []
+        self._etag = etag
+        return self._merge(fresh)
+
+    def _apply(self, record, index=True):
+        if self._loaded:
+            super()._apply(record, index)
+
+    def _commit(self, records):
+        if not records:
+            return
+        self._check_records(records)
+        body = self._request("POST", "/batch", data=json.dumps({"records": records}, default=json_default),
+                             headers={"Content-Type": "application/json"}).json()
+        self._apply_all(records)
+        # Unless someone else committed in between, the copy already matches
+        # the new revision and the next poll needn't refetch it
+        if self._loaded and self._etag is not None and body.get("previous") == self._etag:
+            self._etag = body.get("etag")
+        if not self._loaded:
+            self.revision += 1
+
+    def get(self, sub_id):
+        if self._loaded:
+            return self.by_id.get(sub_id)
+        response = self._request("GET", "/subscriptions/" + quote(sub_id, safe=""))
+        return response.json() if response.status_code == 200 else None
+
+    def iter_subscriptions(self):
+        if self._loaded:
+            return iter(self.subscriptions)
+        return iter(self._fetch_all())
+
+    def query(self, name=None, cycle=None, offset=0, limit=None):
+        if self._loaded:
+            return super().query(name, cycle, offset, limit)
+        params = {"offset": offset, "limit": SERVER_PAGE_SIZE if limit is None else limit}
+        if name:
+            params["name"] = name
+        if cycle:
+            params["cycle"] = cycle
+        page = self._request("GET", "/subscriptions", params=params).json()
+        subs = page["subscriptions"]
+        if limit is None:
+            while len(subs) < page["total"] - offset and page["subscriptions"]:
+                params["offset"] = offset + len(subs)
+                page = self._request("GET", "/subscriptions", params=params).json()
+                subs.extend(page["subscriptions"])
+        return page["total"], subs
+
+    def _remote_totals(self):
+        return self._request("GET", "/totals").json()
+
+    def totals(self):
+        if self._loaded:
+            return super().totals()
+        body = self._remote_totals()
+        return Decimal(body["monthly"]), Decimal(body["yearly"])
+
+    def breakdown(self):
+        if self._loaded:
+            return super().breakdown()
+        return {(row["currency"], row["cycle"]): Decimal(row["sum"])
+                for row in self._remote_totals()["breakdown"]}
+
+    def replace_all(self, subscriptions):
+        current = self.subscriptions if self._loaded else self._fetch_all()
+        assign_subscription_ids(subscriptions)
+        records = [{"op": "delete", "id": sub["id"]} for sub in current]
+        records += [{"op": "add", "sub": sub} for sub in subscriptions]
+        self._commit(records)
+
+    def compact(self):
+        pass
+
+    def close(self):
+        self._session.close()
+
+
+def cli_serve(store, args):
+    store.ensure_loaded()
+    server = make_sync_server(store, args.host, args.port)
+    print(f"Serving {store.path} on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def cycle_arg(value):
+    if value.lower() not in ("monthly", "yearly"):
+        raise argparse.ArgumentTypeError("cycle must be Monthly or Yearly")
+    return value.capitalize()
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="LittleSubber",
+        description="SUBmarine subscription tracker. Without a command the GUI "
+                    "(or the interactive CLI) starts.")
+    parser.add_argument("--file", help="ledger to use (.json, or .db for SQLite)")
+    parser.add_argument("--cli", action="store_true",
+                        help="use the interactive CLI even if the GUI is available")
+    parser.add_argument("--server", metavar="URL",
+                        help="use the ledger of a running 'serve' instance instead of a file")
+    parser.add_argument("--diagnostics", action="store_true",
+                        help="record timings and dump them as JSON to stderr on exit")
+    parser.add_argument("--diagnostics-file", metavar="PATH",
+                        help="like --diagnostics, but write the JSON to PATH")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    p = commands.add_parser("add", help="add a subscription")
+    p.add_argument("name")
+    p.add_argument("price")
+    p.add_argument("--cycle", type=cycle_arg, default="Monthly")
+    p.add_argument("--website")
+    p.add_argument("--currency")
+    p.add_argument("--json", action="store_true", help="print the new subscription as JSON")
+    p.set_defaults(handler=cli_add)
+
+    p = commands.add_parser("delete", help="delete subscriptions by id")
+    p.add_argument("ids", nargs="+")
+    p.add_argument("-q", "--quiet", action="store_true")
+    p.set_defaults(handler=cli_delete)
+
+    p = commands.add_parser("list", help="list subscriptions a page at a time")
+    p.add_argument("--name", help="only names containing this text")
+    p.add_argument("--cycle", type=cycle_arg)
+    p.add_argument("--page", type=int, default=1)
+    p.add_argument("--per-page", type=int, default=20)
+    p.add_argument("--search", help="names containing this text, using the search index")
+    p.add_argument("--sort", choices=[key for key in SearchIndex.SORT_KEYS])
+    p.add_argument("--desc", action="store_true", help="reverse the sort order")
+    p.add_argument("--all", action="store_true", help="no paging")
+    p.add_argument("--format", choices=["text", "json", "jsonl", "csv"], default="text")
+    p.set_defaults(handler=cli_list)
+
+    p = commands.add_parser("totals", help="monthly and yearly totals")
+    p.add_argument("--currency", type=str.upper, help="currency to total in (default: display_currency setting)")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(handler=cli_totals)
+
+    p = commands.add_parser("history", help="month-by-month spend, past or projected")
+    p.add_argument("--from", dest="start", metavar="YYYY-MM", help="first month (default: 11 months ago)")
+    p.add_argument("--to", dest="end", metavar="YYYY-MM", help="last month (default: this month)")
+    p.add_argument("--currency", type=str.upper)
+    p.add_argument("--top", type=int, default=10, help="how many services to break out")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(handler=cli_history)
+
+    p = commands.add_parser("rates", help="show or set exchange rates (rates.json next to the ledger)")
+    p.add_argument("--set", nargs=2, metavar=("CURRENCY", "RATE"),
+                   help="value of one CURRENCY in the base currency")
+    p.set_defaults(handler=cli_rates)
+
+    p = commands.add_parser("due", help="subscriptions renewing in the next N days")
+    p.add_argument("--days", type=int, default=7)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(handler=cli_due)
+
+    p = commands.add_parser("import", help="bulk import from CSV, JSON Lines or JSON")
+    p.add_argument("path", help="file to read, - for stdin")
+    p.add_argument("--format", choices=["csv", "jsonl", "json"])
+    p.set_defaults(handler=cli_import)
+
+    p = commands.add_parser("export", help="export to CSV, JSON Lines or JSON")
+    p.add_argument("path", nargs="?", default="-", help="file to write, - for stdout")
+    p.add_argument("--format", choices=["csv", "jsonl", "json"])
+    p.set_defaults(handler=cli_export)
+
+    p = commands.add_parser("serve", help="share the ledger over a local HTTP API")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=SERVER_PORT)
+    p.set_defaults(handler=cli_serve)
+
+    p = commands.add_parser("optimize-icons", help="re-encode stored icons and merge duplicates")
+    p.add_argument("--workers", type=int, help="encoder processes (default: up to 4)")
+    p.set_defaults(handler=cli_optimize_icons)
+
+    p = commands.add_parser("import-sqlite", help="convert a JSON ledger to SQLite")
+    p.add_argument("json_path", nargs="?")
+    p.add_argument("db_path", nargs="?")
+
+    p = commands.add_parser("check-startup", help="fail if importing this module got slow")
+    p.add_argument("budget_ms", nargs="?", type=float, default=STARTUP_BUDGET_MS)
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if not (args.diagnostics or args.diagnostics_file):
+        return run_command(args)
+    diag.enable()
+    try:
+        return run_command(args)
+    finally:
+        data = json.dumps(diag.snapshot(), indent=2)
+        if not args.diagnostics_file:
+            print(data, file=sys.stderr)
+        else:
+            with open(args.diagnostics_file, "w") as f:
+                f.write(data + "\n")
+
+
+def run_command(args):
+    if args.command == "import-sqlite":
+        count = import_json_to_sqlite(args.json_path or args.file, args.db_path)
+        print(f"Imported {count} subscriptions into SQLite.")
+        return 0
+    if args.command == "check-startup":
+        return 0 if check_startup(args.budget_ms) else 1
+    if args.command:
+        store = RemoteStore(args.server) if args.server else open_store(args.file)
+        # The JSON ledger has to be read to be queried, SQLite and the server don't
+        if not isinstance(store, (SqliteSubscriptionStore, RemoteStore)):
+            store.load()
+        try:
+            return args.handler(store, args)
+        finally:
+            store.close()
+
+    # SUBMARINE_HEADLESS=1 or --cli skips Tk entirely
+    headless = args.cli or os.environ.get("SUBMARINE_HEADLESS") == "1"
+    if not headless and load_gui() is not None:
+        app = SubscriptionTracker(args.file)
+        app.mainloop()
+    else:
+        run_cli(args.file)
+    return 0
+
+
+def run_cli(path=None):
+    store = open_store(path)
+    store.load()
+    currency = display_currency()
+    currency_totals = CurrencyTotals(store, rates_for(store.path))
     while True:
+        subs = store.subscriptions
         # Calculate totals
-        monthly_total = sum(s['price'] if s['cycle'] == 'Monthly' else s['price']/12 for s in subs)
-        yearly_total = sum(s['price']*12 if s['cycle'] == 'Monthly' else s['price'] for s in subs)
+        currency_totals.rates.refresh()
+        monthly_total, yearly_total, unconverted = currency_totals.totals(currency)
         
         print("\nSubscriptions:")
         if not subs:
             print("  (no subscriptions)")
         else:
             for i, s in enumerate(subs, 1):
-                website_info = f" [{s['website']}]" if 'website' in s else ""
-                print(f"  {i}. {s['name']} - ${s['price']:.2f} ({s['cycle']}){website_info}")
-                print(f"     Added: {s.get('date_added','?')}")
+                print(format_subscription(i, s))
             
             print(f"\nTotals:")
-            print(f"  Monthly: ${monthly_total:.2f}")
-            print(f"  Yearly:  ${yearly_total:.2f}")
+            print(f"  Monthly: {format_money(monthly_total, currency)}")
+            print(f"  Yearly:  {format_money(yearly_total, currency)}")
+            if unconverted:
+                print(f"  (not included, no rate for {', '.join(sorted(unconverted))})")
 
         print("\nOptions: (a)dd  (d)elete  (o)pen website  (q)uit")
         choice = input("Choose: ").strip().lower()
         if choice in ("q", "quit"):
-            save_subscriptions(subs)
+            store.close()
             print("Saved. Exiting.")
             break
         if choice in ("a", "add"):
@@ -636,28 +5196,29 @@ def run_cli():
                 continue
             cycle = input("Billing cycle (Monthly/Yearly) [Monthly]: ").strip() or "Monthly"
             cycle = 'Monthly' if cycle.lower() == 'monthly' else 'Yearly' if cycle.lower() == 'yearly' else 'Monthly'
+            sub_currency = input(f"Currency [{currency}]: ").strip().upper() or currency
             website = input("Website URL [optional]: ").strip()
             if website:
                 if not website.startswith(('http://', 'https://')):
                     website = 'https://' + website
             
             sub = {
+                "id": new_subscription_id(),
                 "name": name,
                 "price": price,
                 "cycle": cycle,
+                "currency": sub_currency,
                 "date_added": datetime.now().strftime("%Y-%m-%d"),
                 **({"website": website} if website else {})
             }
-            subs.append(sub)
-            save_subscriptions(subs)
+            store.add(sub)
             print("Added.")
         if choice in ("d", "delete"):
             idx_s = input("Index to delete: ").strip()
             try:
                 idx = int(idx_s) - 1
                 if 0 <= idx < len(subs):
-                    removed = subs.pop(idx)
-                    save_subscriptions(subs)
+                    removed = store.delete(subs[idx]["id"])
                     print(f"Removed {removed['name']}")
                 else:
                     print("Index out of range")
@@ -679,9 +5240,41 @@ def run_cli():
             except ValueError:
                 print("Invalid index")
 
+
+STARTUP_BUDGET_MS = 150
+HEAVY_MODULES = ("requests", "PIL", "customtkinter", "tkinter", "sqlite3", "bs4")
+
+
+def check_startup(budget_ms=STARTUP_BUDGET_MS):
+    """Time a cold import of this module in a fresh interpreter.
+
+    Fails (returns False) when the import takes longer than budget_ms or
+    pulls in any of HEAVY_MODULES, which should only load on first use.
+    """
+    import subprocess
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    module_name = os.path.splitext(os.path.basename(__file__))[0]
+    code = (
+        "import sys, time, json\n"
+        f"sys.path.insert(0, {module_dir!r})\n"
+        "start = time.perf_counter()\n"
+        f"import {module_name}\n"
+        "elapsed = (time.perf_counter() - start) * 1000\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'ms': elapsed, 'heavy': heavy}))\n"
+    )
+    # Best of a few runs so a busy machine doesn't cause a false failure
+    runs = []
+    for _ in range(3):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                             text=True, check=True).stdout
+        runs.append(json.loads(out))
+    best = min(runs, key=lambda r: r["ms"])
+    print(f"Import time: {best['ms']:.1f} ms (budget {budget_ms} ms)")
+    if best["heavy"]:
+        print(f"Heavy modules loaded at import: {', '.join(best['heavy'])}")
+    return best["ms"] <= budget_ms and not best["heavy"]
+
+
 if __name__ == "__main__":
-    if HAS_TK:
-        app = SubscriptionTracker()
-        app.mainloop()
-    else:
-        run_cli()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,379 @@
+"""Benchmarks for the slow paths of LittleSubber.
+
+    python benchmark.py                      run everything that can run here
+    python benchmark.py --quick              smaller ledgers, fewer repeats
+    python benchmark.py --save baseline.json remember the results
+    python benchmark.py --compare baseline.json
+                                             fail if anything got slower (fastest
+                                             runs, by 20% and at least 0.3 ms)
+    python benchmark.py --profile save_10000 cProfile one benchmark
+
+GUI benchmarks need a display. Without one, Xvfb is started if it is
+installed, otherwise they are skipped and only the headless ones run.
+"""
+import sys
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import platform
+import threading
+import statistics
+import subprocess
+from datetime import date, timedelta
+
+import LittleSubber
+
+NAMES = ("Netflix", "Spotify", "Disney+", "YouTube Premium", "iCloud", "Dropbox", "Adobe",
+         "GitHub", "Notion", "Duolingo", "HBO Max", "Xbox Game Pass", "Audible", "Hulu")
+CURRENCIES = ("USD", "USD", "USD", "EUR", "GBP")
+SIZES = (1000, 10000, 50000)
+QUICK_SIZES = (1000, 5000)
+GUI_SIZES = (1000, 10000)
+
+
+def make_ledger(n, seed=0):
+    """n believable subscriptions, the same ones for the same seed."""
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    subs = []
+    for i in range(n):
+        name = rng.choice(NAMES)
+        sub = {
+            "id": "%032x" % rng.getrandbits(128),
+            "name": f"{name} {i}",
+            "price": round(rng.uniform(0.99, 59.99), 2),
+            "cycle": rng.choice(("Monthly", "Monthly", "Yearly")),
+            "date_added": (start + timedelta(days=rng.randrange(2000))).isoformat(),
+        }
+        if rng.random() < 0.7:
+            sub["website"] = f"https://{name.lower().replace(' ', '').replace('+', 'plus')}.example"
+        currency = rng.choice(CURRENCIES)
+        if currency != "USD":
+            sub["currency"] = currency
+        subs.append(sub)
+    return subs
+
+
+def measure(fn, repeat=5):
+    """Timings in seconds of repeat calls to fn."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def summarize(times):
+    return {"median": statistics.median(times), "min": min(times), "runs": len(times)}
+
+
+# Headless benchmarks
+
+def bench_save(workdir, n, repeat):
+    subs = make_ledger(n)
+    path = os.path.join(workdir, f"save_{n}.json")
+    return measure(lambda: LittleSubber.save_subscriptions(subs, path), repeat)
+
+
+def bench_load(workdir, n, repeat):
+    path = os.path.join(workdir, f"load_{n}.json")
+    LittleSubber.save_subscriptions(make_ledger(n), path)
+    return measure(lambda: LittleSubber.load_subscriptions(path), repeat)
+
+
+def bench_add(workdir, n, repeat):
+    # One edit on a big ledger should cost an append, not a rewrite
+    path = os.path.join(workdir, f"add_{n}.json")
+    LittleSubber.save_subscriptions(make_ledger(n), path)
+    store = LittleSubber.SubscriptionStore(path)
+    store.load()
+    extra = iter(make_ledger(repeat, seed=1))
+    times = measure(lambda: store.add(next(extra)), repeat)
+    store.close()
+    return times
+
+
+def bench_totals(workdir, n, repeat):
+    # What update_totals asks the store for
+    store = LittleSubber.SubscriptionStore(os.path.join(workdir, f"totals_{n}.json"))
+    store.replace_all(make_ledger(n))
+
+    def run():
+        store.totals()
+        store.renewals.due_within(7)
+    times = measure(run, repeat)
+    store.close()
+    return times
+
+
+def bench_search(workdir, n, repeat):
+    index = LittleSubber.SearchIndex(make_ledger(n))
+    return measure(lambda: index.view("price", "net", descending=True), repeat)
+
+
+def bench_projection(workdir, n, repeat):
+    # Five years of month-by-month spend, rebuilt from scratch every run
+    store = LittleSubber.SubscriptionStore(os.path.join(workdir, f"projection_{n}.json"))
+    store.replace_all(make_ledger(n))
+    rates = LittleSubber.rates_for(store.path)
+    start = LittleSubber.parse_month("2022-01")
+
+    def run():
+        LittleSubber.ProjectionEngine(store, rates).project(start, start + 59, "USD")
+    times = measure(run, repeat)
+    store.close()
+    return times
+
+
+def start_stub_server():
+    """A local site with a title and an icon, so fetches never leave the machine."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from PIL import Image
+    import io
+
+    buffer = io.BytesIO()
+    Image.new("RGBA", (64, 64), (200, 40, 40, 255)).save(buffer, format="PNG")
+    icon = buffer.getvalue()
+    page = (b"<html><head><title>Stub Service</title>"
+            b"<link rel='icon' sizes='64x64' href='/icon.png'></head>"
+            b"<body>" + b"<p>filler</p>" * 2000 + b"</body></html>")
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            body, kind = (icon, "image/png") if self.path == "/icon.png" else (page, "text/html")
+            self.send_response(200)
+            self.send_header("Content-Type", kind)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    # The head parser hangs up once it has what it needs, that's expected
+    server.handle_error = lambda request, client_address: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_fetch(workdir, n, repeat):
+    server = start_stub_server()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    session = LittleSubber.get_http_session()
+    try:
+        # n fetches per run, over one pooled session like the fetcher does
+        return measure(lambda: [LittleSubber.fetch_website_info(url, session) for _ in range(n)],
+                       repeat)
+    finally:
+        session.close()
+        server.shutdown()
+        server.server_close()
+
+
+# GUI benchmarks
+
+def ensure_display():
+    """A display to run Tk on: the real one, or an Xvfb we start. None if neither."""
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+        return "existing"
+    if not shutil.which("Xvfb"):
+        return None
+    display = f":{random.randrange(100, 900)}"
+    xvfb = subprocess.Popen(["Xvfb", display, "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(0.5)
+    if xvfb.poll() is not None:
+        return None
+    os.environ["DISPLAY"] = display
+    return xvfb
+
+
+def make_tracker(workdir, n):
+    """A SubscriptionTracker on a synthetic ledger that leaves the real settings alone."""
+    LittleSubber.load_gui()
+    path = os.path.join(workdir, f"gui_{n}.json")
+    LittleSubber.save_subscriptions(make_ledger(n), path)
+    settings_path = os.path.join(workdir, "settings.json")
+
+    class BenchTracker(LittleSubber.SubscriptionTracker):
+        def load_settings(self):
+            return LittleSubber.SettingsStore(settings_path)
+
+    app = BenchTracker(path)
+    app.geometry("800x600")
+    app.update()
+    return app
+
+
+def bench_refresh_list(workdir, n, repeat):
+    app = make_tracker(workdir, n)
+    try:
+        def run():
+            app.refresh_subscription_list()
+            app.update()
+        return measure(run, repeat)
+    finally:
+        app.on_close()
+
+
+def bench_color_drag(workdir, n, repeat):
+    # 60 slider events, as a one second drag would send
+    app = make_tracker(workdir, n)
+    try:
+        def run():
+            for step in range(60):
+                app.apply_color_theme(step * 6)
+                app.update()
+        return measure(run, repeat)
+    finally:
+        app.on_close()
+
+
+def bench_update_totals(workdir, n, repeat):
+    app = make_tracker(workdir, n)
+    try:
+        def run():
+            app.update_totals()
+            app.update_idletasks()
+        return measure(run, repeat)
+    finally:
+        app.on_close()
+
+
+def bench_rescale(workdir, n, repeat):
+    # Switch to 250% and back, as the Display Scaling menu does
+    app = make_tracker(workdir, n)
+    try:
+        def run():
+            for factor in (2.5, 1.0):
+                app.apply_scaling(factor)
+                app.update()
+        return measure(run, repeat)
+    finally:
+        app.on_close()
+
+
+def benchmarks(quick=False):
+    """[(name, function, n, repeat, needs_gui)]"""
+    sizes = QUICK_SIZES if quick else SIZES
+    gui_sizes = QUICK_SIZES if quick else GUI_SIZES
+    repeat = 3 if quick else 7
+    found = []
+    for n in sizes:
+        found.append((f"save_{n}", bench_save, n, repeat, False))
+        found.append((f"load_{n}", bench_load, n, repeat, False))
+        found.append((f"add_{n}", bench_add, n, repeat * 10, False))
+        found.append((f"totals_{n}", bench_totals, n, repeat * 10, False))
+        found.append((f"search_{n}", bench_search, n, repeat, False))
+        found.append((f"projection_{n}", bench_projection, n, repeat, False))
+    found.append(("fetch_20", bench_fetch, 20, repeat, False))
+    for n in gui_sizes:
+        found.append((f"refresh_list_{n}", bench_refresh_list, n, repeat, True))
+        found.append((f"update_totals_{n}", bench_update_totals, n, repeat * 10, True))
+        found.append((f"color_drag_{n}", bench_color_drag, n, repeat, True))
+        found.append((f"rescale_{n}", bench_rescale, n, repeat, True))
+    return found
+
+
+def compare(results, baseline, threshold, floor=0.0003):
+    """Print a comparison and return the names that got slower than threshold allows.
+
+    Compares the fastest run, the one least disturbed by whatever else the
+    machine was doing. A slowdown also has to be at least floor seconds:
+    at microsecond scale 20% is noise.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            print(f"  {name:<24} {result['min'] * 1000:10.2f} ms   (new)")
+            continue
+        change = result["min"] / before["min"] - 1
+        flag = ""
+        if change > threshold and result["min"] - before["min"] >= floor:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"  {name:<24} {result['min'] * 1000:10.2f} ms   "
+              f"was {before['min'] * 1000:10.2f} ms   {change:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark LittleSubber's slow paths.")
+    parser.add_argument("--quick", action="store_true", help="smaller ledgers, fewer repeats")
+    parser.add_argument("--only", help="run benchmarks whose name contains this text")
+    parser.add_argument("--headless", action="store_true", help="skip the GUI benchmarks")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="baseline to check the results against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="slowdown that counts as a regression (default 0.2 = 20%%)")
+    parser.add_argument("--floor-ms", type=float, default=0.3,
+                        help="ignore slowdowns smaller than this many ms (default 0.3)")
+    parser.add_argument("--profile", metavar="NAME", help="cProfile one benchmark and print the top calls")
+    args = parser.parse_args(argv)
+
+    selected = [b for b in benchmarks(args.quick)
+                if not args.only or args.only in b[0]]
+    if args.profile:
+        selected = [b for b in benchmarks(args.quick) if b[0] == args.profile]
+        if not selected:
+            print(f"No benchmark called {args.profile}")
+            return 1
+
+    xvfb = None
+    if any(b[4] for b in selected) and not args.headless:
+        xvfb = ensure_display()
+        if xvfb is None:
+            print("No display and no Xvfb, skipping the GUI benchmarks")
+    gui_ok = xvfb is not None and not args.headless
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="subber-bench-")
+    try:
+        for name, fn, n, repeat, needs_gui in selected:
+            if needs_gui and not gui_ok:
+                continue
+            if args.profile:
+                import cProfile
+                import pstats
+                profiler = cProfile.Profile()
+                profiler.runcall(fn, workdir, n, repeat)
+                pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+                return 0
+            results[name] = summarize(fn(workdir, n, repeat))
+            print(f"  {name:<24} {results[name]['median'] * 1000:10.2f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if xvfb not in (None, "existing"):
+            xvfb.terminate()
+
+    status = 0
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)["results"]
+        print(f"\nCompared with {args.compare}:")
+        regressions = compare(results, baseline, args.threshold, args.floor_ms / 1000)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            status = 1
+        else:
+            print("\nNo regressions")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(),
+                       "quick": args.quick, "results": results}, f, indent=2)
+        print(f"Saved baseline to {args.save}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+import io
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import LittleSubber
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+class StubSite:
+    """Local site that answers the first `failures` page requests with 503."""
+
+    def __init__(self, failures=0, status=503):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new("RGBA", (32, 32), (40, 120, 200, 255)).save(buffer, format="PNG")
+        self.icon = buffer.getvalue()
+        self.failures = failures
+        self.status = status
+        self.hits = []
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/icon.png":
+                    status, kind, body = 200, "image/png", site.icon
+                else:
+                    site.hits.append(time.monotonic())
+                    if site.failures > 0:
+                        site.failures -= 1
+                        status, kind, body = site.status, "text/plain", b"down"
+                    else:
+                        status, kind = 200, "text/html"
+                        body = (b"<html><head><title>Stub</title>"
+                                b"<link rel='icon' href='/icon.png'></head></html>")
+                self.send_response(status)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(LittleSubber, "FETCH_RETRY_BASE", 0.1)
+
+
+def make_fetcher(tmp_path, **kwargs):
+    kwargs.setdefault("rate", 100)
+    kwargs.setdefault("burst", 10)
+    return LittleSubber.WebsiteFetcher(LittleSubber.IconStore(str(tmp_path / "icons")),
+                                       queue_path=str(tmp_path / "fetch_queue.json"), **kwargs)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+def wait_for_result(fetcher, key, timeout=10):
+    results = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        results += fetcher.drain()
+        if any(k == key and title for k, title, _ in results):
+            return results
+        time.sleep(0.01)
+    raise AssertionError(f"no result for {key}: {results}")
+
+
+# FetchQueue
+
+def test_backoff_grows_with_jitter_and_is_capped():
+    fetch_queue = LittleSubber.FetchQueue(rng=random.Random(1))
+    for attempts in range(1, 20):
+        full = min(LittleSubber.FETCH_RETRY_CAP, LittleSubber.FETCH_RETRY_BASE * 2 ** (attempts - 1))
+        assert full / 2 <= fetch_queue.backoff(attempts) <= full
+
+
+def test_failed_job_is_rescheduled():
+    fetch_queue = LittleSubber.FetchQueue(rng=random.Random(1))
+    fetch_queue.add("a", "https://example.com")
+    delay = fetch_queue.failed("a", http_error(503), now=1000)
+    (key, job), = fetch_queue.jobs()
+    assert job["attempts"] == 1 and job["next_try"] == 1000 + delay
+    assert not job["offline"]
+
+
+@pytest.mark.parametrize("error", [http_error(404), http_error(410), ValueError("bad url")])
+def test_permanent_errors_drop_the_job(error):
+    fetch_queue = LittleSubber.FetchQueue()
+    fetch_queue.add("a", "https://example.com")
+    assert fetch_queue.failed("a", error, now=0) is None
+    assert "a" not in fetch_queue
+
+
+def test_job_is_dropped_after_max_attempts():
+    fetch_queue = LittleSubber.FetchQueue()
+    fetch_queue.add("a", "https://example.com")
+    for _ in range(LittleSubber.FETCH_MAX_ATTEMPTS - 1):
+        assert fetch_queue.failed("a", http_error(429), now=0) is not None
+    assert fetch_queue.failed("a", http_error(429), now=0) is None
+    assert len(fetch_queue) == 0
+
+
+def test_offline_jobs_wake_when_connectivity_returns():
+    fetch_queue = LittleSubber.FetchQueue()
+    fetch_queue.add("offline", "https://a.example")
+    fetch_queue.add("server_error", "https://b.example")
+    fetch_queue.failed("offline", requests.ConnectionError("down"), now=0)
+    fetch_queue.failed("server_error", http_error(500), now=0)
+    fetch_queue.wake_offline(now=5)
+    jobs = dict(fetch_queue.jobs())
+    assert jobs["offline"]["next_try"] == 5
+    assert jobs["server_error"]["next_try"] > 5
+
+
+def test_queue_survives_restart(tmp_path):
+    path = str(tmp_path / "fetch_queue.json")
+    fetch_queue = LittleSubber.FetchQueue(path)
+    fetch_queue.add("a", "https://example.com", revalidate=True)
+    fetch_queue.failed("a", http_error(503), now=0)
+    fetch_queue.flush()
+    assert dict(LittleSubber.FetchQueue(path).jobs()) == dict(fetch_queue.jobs())
+
+
+def test_token_bucket():
+    bucket = LittleSubber.TokenBucket(rate=1, burst=2, now=0)
+    assert bucket.take(0) == 0 and bucket.take(0) == 0
+    assert bucket.take(0) == pytest.approx(1)
+    assert bucket.take(1) == 0
+
+
+def test_circuit_breaker():
+    breaker = LittleSubber.CircuitBreaker(threshold=2, cooldown=10)
+    breaker.failure(0)
+    assert breaker.allow(0) == 0
+    breaker.failure(1)
+    assert breaker.allow(5) == 6
+    assert breaker.allow(11) == 0      # the probe
+    assert breaker.allow(11) == 10     # nothing else while it runs
+    breaker.failure(11)
+    assert breaker.cooldown == 20 and breaker.allow(30) > 0
+    assert breaker.allow(31) == 0
+    breaker.success()
+    assert not breaker.is_open and breaker.allow(31) == 0
+
+
+# WebsiteFetcher against a local stub server
+
+def test_failing_site_is_retried_with_backoff(tmp_path, fast_retries):
+    site = StubSite(failures=2)
+    fetcher = make_fetcher(tmp_path)
+    try:
+        fetcher.submit("a", site.url)
+        results = wait_for_result(fetcher, "a")
+        assert [title for key, title, _ in results] == [None, None, "Stub"]
+        assert results[-1][2] is not None
+        assert len(fetcher.pending) == 0
+        # The retries waited for their backoff: at least half of 0.1 s, then of 0.2 s
+        first, second, third = site.hits
+        assert second - first >= 0.05 * 0.9
+        assert third - second >= 0.1 * 0.9
+    finally:
+        fetcher.shutdown()
+        site.close()
+
+
+def test_not_found_is_not_retried(tmp_path, fast_retries):
+    site = StubSite(failures=1, status=404)
+    fetcher = make_fetcher(tmp_path)
+    try:
+        fetcher.submit("a", site.url)
+        results = []
+        wait_until(lambda: results.extend(fetcher.drain()) or results)
+        assert results == [("a", None, None)]
+        # Dropped, not rescheduled
+        assert len(site.hits) == 1 and len(fetcher.pending) == 0
+    finally:
+        fetcher.shutdown()
+        site.close()
+
+
+def test_offline_fetch_is_kept_across_restarts(tmp_path, fast_retries):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        closed_url = f"http://127.0.0.1:{sock.getsockname()[1]}/"
+    fetcher = make_fetcher(tmp_path)
+    fetcher.submit("a", closed_url)
+    wait_until(lambda: dict(fetcher.pending.jobs())["a"]["attempts"] >= 1)
+    fetcher.shutdown()
+    with open(tmp_path / "fetch_queue.json") as f:
+        job = json.load(f)["a"]
+    assert job["attempts"] >= 1 and job["offline"]
+
+    # Back online, at the same address: the restarted fetcher finishes the job
+    site = StubSite()
+    fetcher = make_fetcher(tmp_path)
+    try:
+        fetcher.pending.add("a", site.url)
+        fetcher.submit("b", site.url)
+        wait_for_result(fetcher, "a")
+        # b may still be under way
+        wait_until(lambda: len(fetcher.pending) == 0)
+    finally:
+        fetcher.shutdown()
+        site.close()
+
+
+def test_open_circuit_holds_back_requests(tmp_path, fast_retries):
+    site = StubSite(failures=100)
+    fetcher = make_fetcher(tmp_path)
+    try:
+        fetcher.submit("a", site.url)
+        # Wait for the third failure to be recorded, not just received by the site
+        wait_until(lambda: dict(fetcher.pending.jobs())["a"]["attempts"] >= 3)
+        # Three failures in a row opened the circuit, nothing else goes out
+        for key in "bcd":
+            fetcher.submit(key, site.url)
+        # New jobs are due at once (next_try 0) until the scheduler defers them
+        wait_until(lambda: all(job["next_try"] > 0 for key, job in fetcher.pending.jobs()))
+        assert len(site.hits) == 3
+        assert len(fetcher.pending) == 4
+    finally:
+        fetcher.shutdown()
+        site.close()
+
+
+def test_cancelled_job_is_forgotten(tmp_path, fast_retries):
+    site = StubSite(failures=100)
+    other = StubSite()
+    fetcher = make_fetcher(tmp_path)
+    try:
+        fetcher.submit("a", site.url)
+        fetcher.cancel("a")
+        # Once a later job has gone through, the scheduler has seen the cancel
+        fetcher.submit("b", other.url)
+        wait_for_result(fetcher, "b")
+        assert len(fetcher.pending) == 0
+        # At most the request already under way when it was cancelled
+        assert len(site.hits) <= 1
+    finally:
+        fetcher.shutdown()
+        site.close()
+        other.close()
@@ -0,0 +1,77 @@
+import io
+import os
+import signal
+import time
+
+import pytest
+from PIL import Image
+
+import LittleSubber
+
+
+def icon_file(fmt, color, **kwargs):
+    buffer = io.BytesIO()
+    Image.new("RGBA", (512, 512), color).save(buffer, format=fmt, **kwargs)
+    return buffer.getvalue()
+
+
+ICO = icon_file("ICO", (220, 40, 40, 255), sizes=[(16, 16), (32, 32), (48, 48), (128, 128), (256, 256)])
+ICNS = icon_file("ICNS", (40, 80, 220, 255))
+
+
+@pytest.mark.parametrize("data, size, expected", [
+    (ICO, 24, (32, 32)),
+    (ICO, 72, (128, 128)),
+    (ICO, 1000, (256, 256)),
+    # ICNS sizes are (w, h, scale), a frame of w*scale pixels
+    (ICNS, 24, (32, 32)),
+    (ICNS, 72, (128, 128)),
+    (ICNS, 1000, (1024, 1024)),
+])
+def test_best_frame(data, size, expected):
+    image = LittleSubber.best_frame(Image.open(io.BytesIO(data)), size)
+    assert image.size == expected
+    assert image.im.size == expected
+
+
+def test_variants_cover_every_scaling():
+    base, variants = LittleSubber.encode_icon_variants(ICNS)
+    assert Image.open(io.BytesIO(base)).size == LittleSubber.ICON_SIZE
+    assert sorted(variants) == list(LittleSubber.ICON_VARIANT_SIZES)
+    for size, png in variants.items():
+        assert Image.open(io.BytesIO(png)).size == (size, size)
+
+
+def test_identical_icons_are_stored_once(tmp_path):
+    store = LittleSubber.IconStore(str(tmp_path))
+    ids = store.put_many([ICO, ICNS, ICO, b"not an image"])
+    assert ids[0] == ids[2] and ids[3] is None
+    assert store.stats["duplicates"] == 1
+    assert store.open(ids[1], 48).size == (48, 48)
+
+
+def test_broken_pool_is_replaced():
+    pipeline = LittleSubber.IconPipeline(1)
+    try:
+        expected = pipeline.encode(ICO)
+        pool = pipeline._pool
+        for process in list(pool._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+        time.sleep(0.3)
+        # Encoded in process this time, a fresh pool next time
+        assert pipeline.encode(ICO) == expected
+        assert pipeline.encode(ICO) == expected
+        assert pipeline._pool is not None and pipeline._pool is not pool
+    finally:
+        pipeline.shutdown()
+
+
+def test_legacy_icons_are_migrated_once(tmp_path):
+    icon_store = LittleSubber.IconStore(str(tmp_path / "icons"))
+    subs = [{"id": "good", "icon": ICO.hex()}, {"id": "not_hex", "icon": "zz"},
+            {"id": "not_image", "icon": b"not an image".hex()}, {"id": "plain"}]
+    assert LittleSubber.migrate_icon_fields(subs, icon_store)
+    assert not any("icon" in sub for sub in subs)
+    assert subs[0]["icon_id"] and "icon_id" not in subs[1]
+    # Nothing left to decode on the next load
+    assert not LittleSubber.migrate_icon_fields(subs, icon_store)
@@ -0,0 +1,28 @@
+from decimal import Decimal
+
+import LittleSubber
+
+
+def test_other_has_no_stray_cents(tmp_path):
+    store = LittleSubber.open_store(str(tmp_path / "subscriptions.json"))
+    store.load()
+    # 1.01 EUR is 1.0908 USD a month: each month rounds down, the year's total up
+    store.add({"id": "tv", "name": "TV", "price": 1.01, "cycle": "Monthly",
+               "currency": "EUR", "date_added": "2024-01-01"})
+    engine = LittleSubber.ProjectionEngine(store, LittleSubber.rates_for(store.path))
+    start = LittleSubber.parse_month("2024-01")
+    data = engine.project(start, start + 11, "USD")
+    assert data["services"] == [("tv", "TV", Decimal("13.09"))]
+    assert data["other"] == 0 and str(data["other"]) == "0.00"
+    store.close()
+
+
+def test_bad_rates_keep_the_previous_ones(tmp_path):
+    path = tmp_path / "rates.json"
+    path.write_text('{"base": "USD", "rates": {"EUR": "1.10"}}')
+    rates = LittleSubber.ExchangeRates(str(path))
+    for bad in ('{"rates": {"EUR": "abcd"}}', '{"rates": {"EUR": "NaN"}}', '{"rates": {"EUR": 0}}',
+                '{"rates": ["EUR"]}', '[1, 2]', '{"rates":'):
+        path.write_text(bad)
+        assert rates.refresh() is False
+        assert rates.rates["EUR"] == Decimal("1.10")
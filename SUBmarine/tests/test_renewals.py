@@ -0,0 +1,51 @@
+from datetime import date
+
+import LittleSubber
+
+# Every yearly renewal falls inside a lead time this long
+LEAD_DAYS = 400
+
+
+def make_store(tmp_path, count):
+    store = LittleSubber.open_store(str(tmp_path / "subscriptions.json"))
+    store.load()
+    store.add_many([{"id": f"s{i}", "name": f"Service {i}", "price": 5, "cycle": "Yearly",
+                     "date_added": "2020-06-15"} for i in range(count)])
+    return store
+
+
+def test_one_notification_per_check(tmp_path):
+    store = make_store(tmp_path, 50)
+    batches = []
+    scheduler = LittleSubber.RenewalScheduler(store.renewals, LEAD_DAYS, batches.append)
+    scheduler.check(date.today())
+    assert len(batches) == 1 and len(batches[0]) == 50
+    scheduler.check(date.today())
+    assert len(batches) == 1
+    store.close()
+
+
+def test_restarted_scheduler_keeps_quiet(tmp_path):
+    store = make_store(tmp_path, 5)
+    notified = set()
+    batches = []
+    LittleSubber.RenewalScheduler(store.renewals, LEAD_DAYS, batches.append, notified).check()
+    # e.g. the lead time setting changed
+    LittleSubber.RenewalScheduler(store.renewals, LEAD_DAYS + 30, batches.append, notified).check()
+    assert len(batches) == 1
+    renewal, sub = batches[0][0]
+    assert LittleSubber.renewal_key(sub["id"], renewal) in notified
+    store.close()
+
+
+def test_scheduler_follows_rebuilt_index(tmp_path):
+    store = make_store(tmp_path, 5)
+    batches = []
+    scheduler = LittleSubber.RenewalScheduler(lambda: store.renewals, LEAD_DAYS, batches.append)
+    scheduler.check()
+    # Big enough for the store to rebuild its indexes rather than patch them
+    store.add_many([{"id": f"t{i}", "name": f"Tool {i}", "price": 5, "cycle": "Yearly",
+                     "date_added": "2020-06-15"} for i in range(100)])
+    scheduler.check()
+    assert [len(batch) for batch in batches] == [5, 100]
+    store.close()
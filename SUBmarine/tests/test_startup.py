@@ -0,0 +1,12 @@
+import os
+import subprocess
+import sys
+
+import LittleSubber
+
+
+def test_import_stays_light():
+    # The check itself imports the module in fresh interpreters
+    result = subprocess.run([sys.executable, os.path.abspath(LittleSubber.__file__), "check-startup"],
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
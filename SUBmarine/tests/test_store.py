@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+import LittleSubber
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LittleSubber.open_store(str(tmp_path / "subscriptions.json"))
+    store.load()
+    store.add({"id": "netflix", "name": "Netflix", "price": 9.99, "cycle": "Monthly",
+               "date_added": "2024-01-15"})
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize("row", [
+    {"name": "Foo", "price": "nan"},
+    {"name": "Foo", "price": float("inf")},
+    {"name": "Foo", "price": "1e400"},
+    {"name": "Foo", "price": True},
+    {"name": 42, "price": 5},
+    {"name": "Foo", "price": 5, "cycle": 12},
+    {"name": "Foo", "price": 5, "website": ["a"]},
+    ["Foo", 5],
+])
+def test_normalize_rejects_bad_rows(row):
+    with pytest.raises(ValueError):
+        LittleSubber.normalize_subscription(row)
+
+
+@pytest.mark.parametrize("records", [
+    [{"op": "add", "sub": {"id": "foo", "name": "Foo", "price": float("nan")}}],
+    [{"op": "update", "id": "netflix", "changes": {"price": "inf"}}],
+    # The good record before the bad one isn't applied either
+    [{"op": "delete", "id": "netflix"},
+     {"op": "add", "sub": {"id": "foo", "name": "Foo", "price": "abc"}}],
+])
+def test_bad_commit_leaves_the_store_alone(store, records):
+    log_size = os.path.getsize(store.log_path)
+    revision = store.revision
+    with pytest.raises(ValueError):
+        store.apply_batch(records)
+    assert set(store.by_id) == {"netflix"}
+    assert store.get("netflix")["price"] == 9.99
+    assert store.revision == revision
+    assert str(store.totals()[0]) == "9.99"
+    assert os.path.getsize(store.log_path) == log_size
+
+
+def test_cli_rejects_non_finite_price(store, capsys):
+    assert LittleSubber.main(["--file", store.path, "add", "Foo", "nan"]) == 1
+    assert "invalid price" in capsys.readouterr().err
+
+
+def test_import_skips_bad_rows(store, tmp_path, capsys):
+    path = tmp_path / "rows.csv"
+    path.write_text("name,price\nSpotify,5.99\nBroken,inf\nHulu,7.99\n")
+    assert LittleSubber.main(["--file", store.path, "import", str(path)]) == 0
+    assert "Imported 2 subscriptions, skipped 1" in capsys.readouterr().out
+    other = LittleSubber.open_store(store.path)
+    assert sorted(sub["name"] for sub in other.load()) == ["Hulu", "Netflix", "Spotify"]
+    other.close()
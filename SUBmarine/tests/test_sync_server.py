@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+
+import pytest
+import requests
+
+import LittleSubber
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    store = LittleSubber.open_store(str(tmp_path / "subscriptions.json"))
+    store.load()
+    store.add({"id": "netflix", "name": "Netflix", "price": 9.99, "cycle": "Monthly",
+               "date_added": "2024-01-15"})
+    server = LittleSubber.make_sync_server(store, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield store, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+    store.close()
+
+
+def monthly_total(url):
+    return requests.get(url + "/totals").json()["monthly"]
+
+
+@pytest.mark.parametrize("changes", [
+    {"price": "abc"},
+    {"price": -3},
+    {"price": "nan"},
+    {"price": "1e400"},
+    {"name": 42},
+    {"id": "hijack", "price": 5},
+    {"colour": "red"},
+    {"name": "  "},
+    ["price", 5],
+])
+def test_patch_rejects_invalid_changes(ledger, changes):
+    store, url = ledger
+    response = requests.patch(url + "/subscriptions/netflix", json=changes)
+    assert response.status_code == 400
+    assert store.get("netflix")["price"] == 9.99
+    assert set(store.by_id) == {"netflix"}
+    assert monthly_total(url) == "9.99"
+
+
+def test_patch_applies_valid_changes(ledger):
+    store, url = ledger
+    response = requests.patch(url + "/subscriptions/netflix", json={"price": "12.5", "cycle": "yearly"})
+    assert response.status_code == 200
+    assert store.get("netflix")["price"] == 12.5
+    assert store.get("netflix")["cycle"] == "Yearly"
+
+
+@pytest.mark.parametrize("records", [
+    [{"op": "rename"}],
+    [{"op": "add"}],
+    [{"op": "update", "id": "netflix", "changes": {"price": "abc"}}],
+    [{"op": "delete"}],
+    # One bad record rejects the whole batch
+    [{"op": "add", "sub": {"name": "Spotify", "price": 5}}, {"op": "update", "id": "netflix"}],
+    "not a list",
+])
+def test_batch_rejects_invalid_records(ledger, records):
+    store, url = ledger
+    log_size = os.path.getsize(store.log_path)
+    response = requests.post(url + "/batch", json={"records": records})
+    assert response.status_code == 400
+    assert set(store.by_id) == {"netflix"}
+
+    # Nothing reached the shared log, other instances still load and poll fine
+    assert os.path.getsize(store.log_path) == log_size
+    other = LittleSubber.open_store(store.path)
+    other.load()
+    assert other.poll_changes() == []
+    other.close()
+
+
+def test_post_rejects_non_finite_price(ledger):
+    store, url = ledger
+    response = requests.post(url + "/subscriptions", data='{"name": "Foo", "price": NaN}',
+                             headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert set(store.by_id) == {"netflix"}
+    assert monthly_total(url) == "9.99"
+
+
+@pytest.mark.parametrize("method, path, body", [
+    ("POST", "/subscriptions", {"name": 42, "price": 5}),
+    ("POST", "/subscriptions", [{"name": "Foo", "price": 5}, "Bar"]),
+    ("POST", "/batch", [1, 2]),
+    ("POST", "/batch", {"records": [{"op": "update", "id": "netflix", "changes": {"name": 7}}]}),
+    ("PATCH", "/subscriptions/netflix", {"website": 7}),
+])
+def test_malformed_bodies_get_a_400(ledger, method, path, body):
+    store, url = ledger
+    response = requests.request(method, url + path, json=body)
+    assert response.status_code == 400
+    assert set(store.by_id) == {"netflix"}
+
+
+def test_remote_store_skips_its_own_commits(ledger):
+    store, url = ledger
+    remote = LittleSubber.RemoteStore(url)
+    remote.load()
+    remote.add({"id": "spotify", "name": "Spotify", "price": 5, "cycle": "Monthly",
+                "date_added": "2024-02-01"})
+    assert "spotify" in store.by_id
+
+    fetched = []
+    original = remote._fetch
+    remote._fetch = lambda etag=None: fetched.append(original(etag)) or fetched[-1]
+    assert remote.poll_changes() == []
+    assert fetched[0][0] is None  # answered with a 304
+
+    # Changes from anyone else are still picked up
+    requests.patch(url + "/subscriptions/netflix", json={"price": 11})
+    assert remote.poll_changes() == [("update", "netflix")]
+    assert remote.get("netflix")["price"] == 11
+
+
+def test_remote_store_refetches_when_others_committed_first(ledger):
+    store, url = ledger
+    remote = LittleSubber.RemoteStore(url)
+    remote.load()
+    requests.post(url + "/subscriptions", data=json.dumps({"id": "hulu", "name": "Hulu", "price": 8}))
+    remote.delete("netflix")
+    assert ("add", "hulu") in remote.poll_changes()
+    assert set(remote.by_id) == {"hulu"}
+
+
+def test_remote_fetch_overtaken_by_a_local_commit_is_dropped(ledger):
+    store, url = ledger
+    remote = LittleSubber.RemoteStore(url)
+    remote.load()
+    requests.patch(url + "/subscriptions/netflix", json={"price": 11})
+    # Fetched on the GUI's worker thread, merged later on the Tk thread
+    fetched = remote.fetch_changes()
+    remote.delete("netflix")
+    assert remote.merge_changes(fetched) == []
+    assert remote.get("netflix") is None
+    assert remote.poll_changes() == []
+    assert set(remote.by_id) == set(store.by_id) == set()